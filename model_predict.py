@@ -64,6 +64,160 @@ all_llm_community_models = App().list_models(filter_by={"query": "LLM",
 for llm_model in all_llm_community_models:
   print("Model ID ", llm_model.id)
 
+"""#### Local model catalog
+
+Walking the community catalog fetches every page again on each run. `iter_model_pages` fetches pages concurrently a few pages ahead of the consumer, and `ModelCatalog` stores the results in a local SQLite index with full-text search over model id, description and model type, including the `OutputInfo` params of each model.
+
+`refresh` is incremental: models are listed newest-modified first and paging stops as soon as it reaches models older than the previous refresh with the same `filter_by`, so later refreshes only fetch what changed. Every filter keeps its own refresh state, so a refresh with a new filter lists everything that filter matches. Models deleted upstream are only noticed by `refresh(..., full=True)`, which walks the whole listing up to its last page and removes the models that filter no longer returns. The end of the listing is decided from the page size the API returns, as `App.list_models` silently skips models without a version and a page can come back empty before the end. Model discovery and parameter lookups then run locally in milliseconds.
+"""
+
+import json
+import sqlite3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from clarifai.client.model import Model
+from clarifai_grpc.grpc.api import service_pb2
+from google.protobuf import json_format
+
+def iter_model_pages(app, filter_by={}, only_in_app=False, per_page=100, prefetch=4):
+    """Yield pages of models in order, with up to `prefetch` pages being fetched concurrently.
+
+    Paging ends on the first page the API returns with fewer than `per_page` models. Models without a
+    `model_version` are skipped like `App.list_models` does, so a page can be shorter or even empty before the end.
+    """
+    def fetch(page_no):
+        # `App.list_models` filters the page before we could see its size, so list the raw page instead
+        listed = list(app.list_pages_generator(app.STUB.ListModels, service_pb2.ListModelsRequest,
+                                               dict(user_app_id=app.user_app_id, **filter_by),
+                                               page_no=page_no, per_page=per_page))
+        models = [Model.from_auth_helper(auth=app.auth_helper, **model_info) for model_info in listed
+                  if "model_version" in model_info and (not only_in_app or model_info["app_id"] == app.id)]
+        return models, len(listed)
+
+    with ThreadPoolExecutor(max_workers=prefetch) as executor:
+        pending = deque(executor.submit(fetch, page_no) for page_no in range(1, prefetch + 1))
+        next_page_no = prefetch + 1
+        while pending:
+            page, n_listed = pending.popleft().result()
+            yield page
+            if n_listed < per_page:
+                break # last page of the listing
+            pending.append(executor.submit(fetch, next_page_no))
+            next_page_no += 1
+        for future in pending:
+            future.cancel()
+
+class ModelCatalog:
+    """Local SQLite index of models, searchable with full-text queries."""
+
+    def __init__(self, path="model_catalog.sqlite"):
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS models (
+            key TEXT PRIMARY KEY, user_id TEXT, app_id TEXT, model_id TEXT, model_type_id TEXT,
+            description TEXT, modified_at REAL, params TEXT)""")
+        # Newest `modified_at` seen by the last refresh with each filter, and the models each filter listed
+        self._db.execute("CREATE TABLE IF NOT EXISTS refresh_state (filter TEXT PRIMARY KEY, modified_at REAL)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS listings (filter TEXT, key TEXT, PRIMARY KEY (filter, key))")
+        try:
+            self._db.execute("CREATE VIRTUAL TABLE IF NOT EXISTS models_fts USING "
+                             "fts5(key UNINDEXED, model_id, description, model_type_id)")
+            self.full_text = True
+        except sqlite3.OperationalError: # SQLite built without FTS5
+            self.full_text = False
+
+    def last_modified(self, filter_key):
+        row = self._db.execute("SELECT modified_at FROM refresh_state WHERE filter = ?", (filter_key,)).fetchone()
+        return row[0] if row else 0
+
+    @staticmethod
+    def _row(info):
+        params = json_format.MessageToDict(info.model_version.output_info.params)
+        modified_at = info.modified_at.seconds + info.modified_at.nanos / 1e9
+        return (f"{info.user_id}/{info.app_id}/{info.id}", info.user_id, info.app_id, info.id, info.model_type_id,
+                info.description, modified_at, json.dumps(params))
+
+    def upsert(self, rows):
+        """Write the `rows` that are new or have a different `modified_at`, returns the rows written."""
+        keys = [row[0] for row in rows]
+        known = dict(self._db.execute(f"SELECT key, modified_at FROM models WHERE key IN ({','.join('?' * len(keys))})",
+                                      keys))
+        rows = [row for row in rows if known.get(row[0]) != row[6]]
+        with self._db:
+            self._db.executemany("INSERT OR REPLACE INTO models VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            if self.full_text:
+                self._db.executemany("DELETE FROM models_fts WHERE key = ?", [(row[0],) for row in rows])
+                self._db.executemany("INSERT INTO models_fts VALUES (?, ?, ?, ?)",
+                                     [(row[0], row[3], row[5], row[4]) for row in rows])
+        return rows
+
+    def _remove_unlisted(self, filter_key, listed_keys):
+        """Drop the models `filter_key` listed before but not anymore, unless another filter still lists them."""
+        previous = {key for (key,) in self._db.execute("SELECT key FROM listings WHERE filter = ?", (filter_key,))}
+        gone = [(key,) for key in previous - listed_keys]
+        with self._db:
+            self._db.executemany("DELETE FROM listings WHERE filter = ? AND key = ?",
+                                 [(filter_key, key) for (key,) in gone])
+            unlisted = "key = ? AND key NOT IN (SELECT key FROM listings)"
+            self._db.executemany(f"DELETE FROM models WHERE {unlisted}", gone)
+            if self.full_text:
+                self._db.executemany(f"DELETE FROM models_fts WHERE {unlisted}", gone)
+        return len(gone)
+
+    def refresh(self, app, filter_by={}, per_page=100, prefetch=4, full=False):
+        """Fetch models modified since the last refresh with the same `filter_by`.
+
+        With `full`, the whole listing is fetched and models it no longer contains are removed.
+        Returns the number of models added or changed.
+        """
+        filter_key = json.dumps(filter_by, sort_keys=True, default=str)
+        since = 0 if full else self.last_modified(filter_key)
+        newest, updated, listed_keys, complete = since, 0, set(), False
+        for page in iter_model_pages(app, {**filter_by, "sort_by_modified_at": True}, per_page=per_page,
+                                     prefetch=prefetch):
+            rows = [self._row(model.model_info) for model in page]
+            if not rows:
+                continue # every model of the page was skipped, the listing may still go on
+            updated += len(self.upsert(rows))
+            listed_keys.update(row[0] for row in rows)
+            newest = max([newest] + [row[6] for row in rows])
+            if min(row[6] for row in rows) <= since:
+                break # the rest of the listing is older than the previous refresh with this filter
+        else:
+            complete = True
+        with self._db:
+            self._db.executemany("INSERT OR IGNORE INTO listings VALUES (?, ?)",
+                                 [(filter_key, key) for key in listed_keys])
+            self._db.execute("INSERT OR REPLACE INTO refresh_state VALUES (?, ?)", (filter_key, newest))
+        # Only a listing walked up to its last page tells which models are gone
+        if full and complete:
+            self._remove_unlisted(filter_key, listed_keys)
+        return updated
+
+    def search(self, query, model_type_id=None, limit=20):
+        """Return `(user_id, app_id, model_id, model_type_id, description)` of models matching `query`."""
+        columns = "m.user_id, m.app_id, m.model_id, m.model_type_id, m.description"
+        type_filter, args = ("AND m.model_type_id = ?", [model_type_id]) if model_type_id else ("", [])
+        if self.full_text:
+            sql = (f"SELECT {columns} FROM models_fts f JOIN models m ON m.key = f.key "
+                   f"WHERE models_fts MATCH ? {type_filter} ORDER BY f.rank LIMIT ?")
+            return self._db.execute(sql, [query] + args + [limit]).fetchall()
+        sql = (f"SELECT {columns} FROM models m WHERE (m.model_id LIKE ? OR m.description LIKE ?) "
+               f"{type_filter} LIMIT ?")
+        return self._db.execute(sql, [f"%{query}%", f"%{query}%"] + args + [limit]).fetchall()
+
+    def params(self, user_id, app_id, model_id):
+        """Return the `OutputInfo` params of a model as a dict, or None if it is not in the catalog."""
+        row = self._db.execute("SELECT params FROM models WHERE key = ?",
+                               (f"{user_id}/{app_id}/{model_id}",)).fetchone()
+        return json.loads(row[0]) if row else None
+
+catalog = ModelCatalog()
+print("Models updated: ", catalog.refresh(App(), filter_by={"model_type_id": "text-to-text"}))
+
+for user_id, app_id, model_id, model_type_id, description in catalog.search("LLM", model_type_id="text-to-text"):
+  print("Model ID ", model_id, catalog.params(user_id, app_id, model_id))
+
 """### Get Model Details
 
 Below cell is how to know more on details of model(description, usecases..etc) and info on training or other inference parameters(eg: temperature, top_k, max_tokens..etc for LLMs)
@@ -85,6 +239,593 @@ model = Model("https://clarifai.com/clarifai/main/models/general-image-recogniti
                     # or
 model = Model(user_id="clarifai", app_id="main", model_id="general-image-recognition")
 
+"""### Reusing Model objects
+
+Every `Model(...)` call parses the URL and sets up a new gRPC channel and stub, and printing a model fetches its description from the API. When the same models are used over and over it is cheaper to build each one once and share it.
+
+`ModelRegistry` keeps a thread-safe, LRU-bounded cache of `Model` objects keyed by `(user_id, app_id, model_id, model_version_id)`, together with a TTL cache of model descriptions. The rest of this notebook gets its models through `get_model`.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+class ModelRegistry:
+    """Process-wide cache of `Model` objects and their descriptions."""
+
+    def __init__(self, max_models=32, info_ttl=600):
+        self.max_models = max_models
+        self.info_ttl = info_ttl # seconds a cached model description stays valid
+        self._models = OrderedDict()
+        self._info = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def model_key(model_url):
+        """Split a model URL into `(user_id, app_id, model_id, model_version_id)`."""
+        # https://clarifai.com/{user_id}/{app_id}/models/{model_id}[/model_version/{model_version_id}]
+        parts = model_url.rstrip("/").split("/")
+        user_id, app_id, _, model_id = parts[3:7]
+        model_version_id = parts[8] if len(parts) > 8 else None
+        return user_id, app_id, model_id, model_version_id
+
+    def get(self, model_url):
+        """Return the shared `Model` for `model_url`, creating it on first use."""
+        key = self.model_key(model_url)
+        with self._lock:
+            if key in self._models:
+                self._models.move_to_end(key)
+                return self._models[key]
+        # Build outside the lock, setting up the channel can take a while
+        model = Model(model_url)
+        with self._lock:
+            model = self._models.setdefault(key, model)
+            self._models.move_to_end(key)
+            while len(self._models) > self.max_models:
+                evicted_key, _ = self._models.popitem(last=False)
+                self._info.pop(evicted_key, None)
+        return model
+
+    def describe(self, model_url):
+        """Return the model description (what `print(model)` shows), cached for `info_ttl` seconds.
+
+        Once the cached description expires, the model info is fetched again with `load_info()`, which also
+        updates the info of the shared `Model` returned by `get`.
+        """
+        key = self.model_key(model_url)
+        with self._lock:
+            cached = self._info.get(key)
+        if cached is not None and time.monotonic() - cached[0] < self.info_ttl:
+            return cached[1]
+        model = self.get(model_url)
+        # `str(model)` only fetches the info while the model hasn't loaded it yet, so fetch it explicitly
+        model.load_info()
+        description = str(model)
+        with self._lock:
+            self._info[key] = (time.monotonic(), description)
+        return description
+
+model_registry = ModelRegistry()
+get_model = model_registry.get
+
+"""Measuring cold-start against reuse"""
+
+model_url = "https://clarifai.com/clarifai/main/models/general-image-recognition"
+
+start = time.perf_counter()
+Model(model_url)
+print(f"New Model object:    {(time.perf_counter() - start) * 1000:.2f} ms")
+
+get_model(model_url)
+start = time.perf_counter()
+n_lookups = 1000
+for _ in range(n_lookups):
+    get_model(model_url)
+print(f"Registry lookup:     {(time.perf_counter() - start) * 1000 / n_lookups:.4f} ms")
+
+start = time.perf_counter()
+model_registry.describe(model_url)
+print(f"Describe (cold):     {(time.perf_counter() - start) * 1000:.2f} ms")
+start = time.perf_counter()
+model_registry.describe(model_url)
+print(f"Describe (cached):   {(time.perf_counter() - start) * 1000:.2f} ms")
+
+"""### Batch Predictions
+
+Sending a single input per `predict_by_*` call means every prediction pays a full network round trip. `Model.predict` accepts a list of inputs, so when you have many inputs it is much faster to pack them into batches (up to 128 inputs per request) and keep a few batches in flight at once.
+
+`predict_in_batches` takes any iterable of inputs, sends them in batches across a bounded thread pool and yields `(input, output)` pairs, either in input order or as soon as each batch finishes. Inputs are only pulled from the iterable when a worker is free, so very large (or lazily generated) input lists never have to be held in memory.
+
+*Note: every input needs a unique `input_id`, it is used to match outputs back to their inputs*
+
+The throughput of one call per input and of batched predictions is compared against a local mock of the predict service in the Benchmarking Client Performance section.
+"""
+
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+
+from clarifai.client.input import Inputs
+
+MAX_PREDICT_INPUTS = 128 # Maximum number of inputs in a single predict request
+
+def batched(inputs, batch_size=MAX_PREDICT_INPUTS, max_batch_bytes=None):
+    """Group an iterable of inputs into lists of at most `batch_size` inputs.
+
+    If `max_batch_bytes` is set, a batch is also closed once the serialized size of its inputs
+    would exceed it (a single input larger than the limit still gets its own batch).
+    """
+    if max_batch_bytes is None:
+        iterator = iter(inputs)
+        while True:
+            batch = list(islice(iterator, batch_size))
+            if not batch:
+                return
+            yield batch
+
+    batch, batch_bytes = [], 0
+    for inp in inputs:
+        size = inp.ByteSize()
+        if batch and (len(batch) == batch_size or batch_bytes + size > max_batch_bytes):
+            yield batch
+            batch, batch_bytes = [], 0
+        batch.append(inp)
+        batch_bytes += size
+    if batch:
+        yield batch
+
+def _drain(pending, ordered):
+    """Wait for the oldest batch (ordered) or any finished batch and yield its results."""
+    if ordered:
+        done = [pending.pop(0)]
+    else:
+        finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+        done = [future for future in pending if future in finished]
+        for future in done:
+            pending.remove(future)
+    for future in done:
+        yield from future.result()
+
+def predict_in_batches(model, inputs, batch_size=MAX_PREDICT_INPUTS, max_workers=4, ordered=True,
+                       inference_params={}, output_config={}, max_batch_bytes=None, return_exceptions=False):
+    """Predict `inputs` with `model` in batches, keeping at most `max_workers` requests in flight.
+
+    With `return_exceptions`, a failed batch is retried one input at a time, and inputs that still fail
+    are yielded with the exception in place of their output instead of raising it.
+    """
+    def predict_batch(batch):
+        try:
+            response = model.predict(batch, inference_params=inference_params, output_config=output_config)
+        except Exception as error:
+            if not return_exceptions:
+                raise
+            if len(batch) == 1:
+                return [(batch[0], error)]
+            return [result for inp in batch for result in predict_batch([inp])]
+        outputs = {output.input.id: output for output in response.outputs}
+        return [(inp, outputs.get(inp.id)) for inp in batch]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = []
+        for batch in batched(inputs, batch_size, max_batch_bytes):
+            pending.append(executor.submit(predict_batch, batch))
+            # Backpressure: don't read more inputs until a batch slot frees up
+            while len(pending) >= max_workers:
+                yield from _drain(pending, ordered)
+        while pending:
+            yield from _drain(pending, ordered)
+
+"""Predicting a list of image URLs with `general-image-recognition`"""
+
+image_urls = [
+    "https://samples.clarifai.com/metro-north.jpg",
+    "https://samples.clarifai.com/dog2.jpeg",
+    "https://s3.amazonaws.com/samples.clarifai.com/featured-models/general-elephants.jpg",
+] * 20
+
+inputs = (Inputs.get_input_from_url(input_id=str(i), image_url=url) for i, url in enumerate(image_urls))
+
+for inp, output in predict_in_batches(model, inputs, batch_size=16):
+    print(f"{inp.id}: {inp.data.image.url} -> {output.data.concepts[0].name}")
+
+"""### Async Predictions
+
+The `predict_by_*` methods block until the response arrives. In asyncio applications, `AsyncModel` offers the same entry points as coroutines, built directly on a gRPC aio channel. All calls of an `AsyncModel` share one channel to the API base URL of the wrapped `Model` and use its credentials, `max_concurrency` limits how many requests are in flight, every call takes an optional `timeout` (deadline in seconds) and cancelling the awaiting task cancels the RPC.
+"""
+
+import asyncio
+
+from clarifai_grpc.channel.clarifai_channel import ClarifaiChannel
+from clarifai_grpc.grpc.api import resources_pb2, service_pb2, service_pb2_grpc
+from clarifai_grpc.grpc.api.status import status_code_pb2
+from google.protobuf.struct_pb2 import Struct
+
+def predict_request(model_info, inputs, inference_params={}, output_config={}):
+    """Build the `PostModelOutputsRequest` for predicting `inputs` with the model described by `model_info`."""
+    params = Struct()
+    params.update(inference_params)
+    return service_pb2.PostModelOutputsRequest(
+        user_app_id=resources_pb2.UserAppIDSet(user_id=model_info.user_id, app_id=model_info.app_id),
+        model_id=model_info.id,
+        version_id=model_info.model_version.id,
+        inputs=inputs,
+        model=resources_pb2.Model(model_version=resources_pb2.ModelVersion(
+            output_info=resources_pb2.OutputInfo(params=params,
+                                                 output_config=resources_pb2.OutputConfig(**output_config)))))
+
+class AsyncModel:
+    """asyncio version of the `Model` predict methods over a shared gRPC aio channel."""
+
+    def __init__(self, model, max_concurrency=100, channel=None):
+        self.model_info = model.model_info
+        self._channel = channel or self._aio_channel(model.auth_helper.base)
+        self._stub = service_pb2_grpc.V2Stub(self._channel)
+        self._metadata = model.auth_helper.metadata # PAT or session token the model was created with
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    @staticmethod
+    def _aio_channel(base):
+        """Open an aio channel to an API base URL like `https://api.clarifai.com` or `http://localhost:8080`."""
+        scheme, _, address = base.partition("://")
+        if scheme == "https":
+            return ClarifaiChannel.get_aio_grpc_channel(base=address)
+        host, _, port = address.partition(":")
+        return ClarifaiChannel.get_aio_insecure_grpc_channel(base=host, port=int(port or 80))
+
+    async def predict(self, inputs, inference_params={}, output_config={}, timeout=None):
+        request = predict_request(self.model_info, inputs, inference_params, output_config)
+        async with self._semaphore:
+            response = await self._stub.PostModelOutputs(request, metadata=self._metadata, timeout=timeout)
+        if response.status.code != status_code_pb2.SUCCESS:
+            raise Exception(f"Model Predict failed with response {response.status!r}")
+        return response
+
+    async def predict_by_url(self, url, input_type, inference_params={}, output_config={}, timeout=None):
+        inp = Inputs.get_input_from_url(input_id="", **{f"{input_type}_url": url})
+        return await self.predict([inp], inference_params, output_config, timeout)
+
+    async def predict_by_bytes(self, input_bytes, input_type, inference_params={}, output_config={}, timeout=None):
+        inp = Inputs.get_input_from_bytes(input_id="", **{f"{input_type}_bytes": input_bytes})
+        return await self.predict([inp], inference_params, output_config, timeout)
+
+    async def predict_by_filepath(self, filepath, input_type, inference_params={}, output_config={}, timeout=None):
+        inp = Inputs.get_input_from_file(input_id="", **{f"{input_type}_file": filepath})
+        return await self.predict([inp], inference_params, output_config, timeout)
+
+    async def close(self):
+        await self._channel.close()
+
+"""Keeping all the image URLs in flight at once from a single event loop"""
+
+async def predict_all(urls):
+    async_model = AsyncModel(get_model("https://clarifai.com/clarifai/main/models/general-image-recognition"),
+                             max_concurrency=50)
+    try:
+        return await asyncio.gather(*(async_model.predict_by_url(url, "image", timeout=30) for url in urls),
+                                    return_exceptions=True)
+    finally:
+        await async_model.close()
+
+# Inside a notebook the event loop is already running, use `await predict_all(image_urls)` there
+responses = asyncio.run(predict_all(image_urls))
+for url, response in zip(image_urls, responses):
+    if isinstance(response, Exception):
+        print(f"{url}: failed with {response!r}")
+    else:
+        print(f"{url}: {response.outputs[0].data.concepts[0].name}")
+
+"""### Rate Limiting and Retries
+
+A burst of predictions can exceed the rate limit of your account, and the API then rejects calls as throttled. `PredictScheduler` sends predict calls through a token bucket per model that adapts to the throttling it observes: the request rate is halved on every throttled call and slowly increased again on successes. Throttled calls are retried with jittered exponential backoff, every call can have a `timeout` (deadline in seconds covering all retries), and with `hedge=True` a second identical request is sent if the first one is slower than the recent 95th percentile latency and the rate limit has a token to spare right away, the first response wins.
+"""
+
+import random
+from collections import deque
+from functools import partial
+
+import grpc
+
+THROTTLED_MARKERS = ("CONN_THROTTLED", "RESOURCE_EXHAUSTED")
+
+def is_throttled(error):
+    """Whether `error` means the request was rejected by the API rate limit."""
+    if isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.RESOURCE_EXHAUSTED:
+        return True
+    return any(marker in str(error) for marker in THROTTLED_MARKERS)
+
+class AdaptiveTokenBucket:
+    """Token bucket whose rate is halved on throttling and raised additively on success."""
+
+    def __init__(self, rate=10.0, max_rate=100.0, min_rate=0.5, increase=0.5):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.increase = increase
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self):
+        """Take a token if one is available, otherwise return the time to wait for the next one (under the lock)."""
+        now = time.monotonic()
+        self._tokens = min(max(self.rate, 1.0), self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    def acquire(self, deadline=None):
+        """Block until a token is available, raising `TimeoutError` if that is after `deadline`."""
+        while True:
+            with self._lock:
+                wait_time = self._take()
+            if not wait_time:
+                return
+            if deadline is not None and time.monotonic() + wait_time > deadline:
+                raise TimeoutError("Predict deadline exceeded while waiting for rate limit")
+            time.sleep(wait_time)
+
+    def try_acquire(self):
+        """Take a token if one is available right now, without waiting."""
+        with self._lock:
+            return not self._take()
+
+    def on_success(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def on_throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+class PredictScheduler:
+    """Run `Model` predict calls with per-model adaptive rate limiting, retries and optional hedging."""
+
+    def __init__(self, rate=10.0, max_rate=100.0, max_retries=5, base_delay=0.5, max_delay=30.0,
+                 hedge_quantile=0.95, max_workers=16):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge_quantile = hedge_quantile
+        self._buckets = {}
+        self._latencies = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+    def _model_state(self, model):
+        info = model.model_info
+        key = (info.user_id, info.app_id, info.id)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = AdaptiveTokenBucket(self.rate, self.max_rate)
+                self._latencies[key] = deque(maxlen=200)
+            return self._buckets[key], self._latencies[key]
+
+    def _hedge_delay(self, latencies):
+        if len(latencies) < 20:
+            return None # not enough samples for a meaningful percentile yet
+        ordered = sorted(latencies)
+        return ordered[int(self.hedge_quantile * (len(ordered) - 1))]
+
+    def _attempt(self, call, bucket, latencies, deadline, hedge):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        futures = [self._executor.submit(call)]
+        hedge_delay = self._hedge_delay(latencies) if hedge else None
+        if hedge_delay is not None and (remaining is None or hedge_delay < remaining):
+            done, _ = wait(futures, timeout=hedge_delay)
+            # Only hedge with a token that is available right away, waiting for one would delay the first response
+            if not done and bucket.try_acquire():
+                futures.append(self._executor.submit(call))
+        error = None
+        while futures:
+            remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+            done, _ = wait(futures, timeout=remaining, return_when=FIRST_COMPLETED)
+            if not done:
+                raise TimeoutError("Predict deadline exceeded")
+            for future in done:
+                futures.remove(future)
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, model, method, *args, timeout=None, hedge=False, **kwargs):
+        """Call `model.<method>(*args, **kwargs)`, e.g. `scheduler.call(model, "predict_by_url", url, "image")`."""
+        bucket, latencies = self._model_state(model)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        call = partial(getattr(model, method), *args, **kwargs)
+        for attempt in range(self.max_retries + 1):
+            bucket.acquire(deadline)
+            start = time.monotonic()
+            try:
+                result = self._attempt(call, bucket, latencies, deadline, hedge)
+            except Exception as error:
+                if not is_throttled(error) or attempt == self.max_retries:
+                    raise
+                bucket.on_throttled()
+                # Full jitter keeps retries of concurrent callers from synchronizing
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+                if deadline is not None and time.monotonic() + delay > deadline:
+                    raise TimeoutError("Predict deadline exceeded while retrying") from error
+                time.sleep(delay)
+            else:
+                bucket.on_success()
+                latencies.append(time.monotonic() - start)
+                return result
+
+scheduler = PredictScheduler(rate=5, max_rate=50)
+
+model = get_model("https://clarifai.com/clarifai/main/models/general-image-recognition")
+with ThreadPoolExecutor(max_workers=16) as executor:
+    responses = executor.map(
+        lambda url: scheduler.call(model, "predict_by_url", url, "image", timeout=60, hedge=True), image_urls)
+    for url, response in zip(image_urls, responses):
+        print(f"{url}: {response.outputs[0].data.concepts[0].name}")
+
+"""Simulating throttling and slow responses locally shows how the scheduler backs off and hedges"""
+
+class FlakyModel:
+    """Stand-in for `Model` that throttles a fraction of calls and has a long latency tail."""
+
+    def __init__(self, throttle_rate=0.1):
+        self.model_info = resources_pb2.Model(id="flaky-model", user_id="me", app_id="test")
+        self.throttle_rate = throttle_rate
+        self.calls = 0
+
+    def predict_by_url(self, url, input_type):
+        self.calls += 1
+        if random.random() < self.throttle_rate:
+            raise Exception("Model Predict failed with response code: CONN_THROTTLED")
+        time.sleep(random.choice([0.01] * 19 + [1.0]))
+        return url
+
+flaky_model = FlakyModel()
+start = time.perf_counter()
+for i in range(100):
+    scheduler.call(flaky_model, "predict_by_url", str(i), "image", hedge=True)
+print(f"100 predictions in {time.perf_counter() - start:.1f} s with {flaky_model.calls} calls, "
+      f"final rate {scheduler._model_state(flaky_model)[0].rate:.1f} req/s")
+
+"""### Measuring Prediction Latency
+
+To find out whether a slow run is spent in the API or in your own code, `InstrumentedModel` wraps a `Model` and records the time of every predict call in histograms, split into phases:
+ - `build` - building and encoding the input protobufs
+ - `rpc` - the predict request, covering network and server-side processing (the API does not report server time separately)
+ - `decode` - your post-processing of the response, timed with `metrics.timer("decode", ...)`
+
+Every observation is labelled with the model id, model version, input type and batch size. `metrics.to_openmetrics()` renders all histograms in the Prometheus / OpenMetrics text format, `profile_span` profiles a block of code with `cProfile`, and if OpenTelemetry is installed every timed phase is also recorded as a tracing span.
+"""
+
+import bisect
+import cProfile
+import pstats
+from contextlib import contextmanager, nullcontext
+
+try:
+    from opentelemetry import trace
+    tracer = trace.get_tracer("clarifai-predict")
+except ImportError:
+    tracer = None
+
+class LatencyHistogram:
+    """Cumulative-bucket histogram of durations in seconds."""
+
+    BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+    def __init__(self):
+        self.counts = [0] * (len(self.BUCKETS) + 1) # last bucket is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+
+class PredictMetrics:
+    """Latency histograms per predict phase and label set."""
+
+    def __init__(self):
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+    def observe(self, phase, seconds, **labels):
+        key = (phase, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = LatencyHistogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, phase, **labels):
+        span = tracer.start_as_current_span(f"predict.{phase}", attributes=labels) if tracer else nullcontext()
+        start = time.perf_counter()
+        with span:
+            yield
+        self.observe(phase, time.perf_counter() - start, **labels)
+
+    def to_openmetrics(self):
+        lines = ["# TYPE clarifai_predict_seconds histogram"]
+        with self._lock:
+            for (phase, labels), histogram in sorted(self._histograms.items()):
+                label_text = ",".join([f'phase="{phase}"'] + [f'{name}="{value}"' for name, value in labels])
+                cumulative = 0
+                for bound, count in zip(LatencyHistogram.BUCKETS + ("+Inf",), histogram.counts):
+                    cumulative += count
+                    lines.append(f'clarifai_predict_seconds_bucket{{{label_text},le="{bound}"}} {cumulative}')
+                lines.append(f"clarifai_predict_seconds_sum{{{label_text}}} {histogram.sum}")
+                lines.append(f"clarifai_predict_seconds_count{{{label_text}}} {histogram.count}")
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+@contextmanager
+def profile_span(sort_by="cumulative", limit=20):
+    """Profile the enclosed block with cProfile and print its top `limit` functions."""
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        pstats.Stats(profiler).sort_stats(sort_by).print_stats(limit)
+
+class InstrumentedModel:
+    """Wrap a `Model` so every predict entry point is timed into `metrics`."""
+
+    def __init__(self, model, metrics):
+        self.model = model
+        self.metrics = metrics
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
+
+    def _labels(self, input_type, batch_size):
+        return dict(model_id=self.model.model_info.id, model_version_id=self.model.model_info.model_version.id,
+                    input_type=input_type, batch_size=batch_size)
+
+    def predict(self, inputs, inference_params={}, output_config={}):
+        data = inputs[0].data
+        input_type = next((field for field in ("image", "video", "audio", "text") if data.HasField(field)), "other")
+        with self.metrics.timer("rpc", **self._labels(input_type, len(inputs))):
+            return self.model.predict(inputs, inference_params=inference_params, output_config=output_config)
+
+    def _predict_one(self, build_input, input_type, inference_params, output_config):
+        with self.metrics.timer("build", **self._labels(input_type, 1)):
+            inp = build_input()
+        with self.metrics.timer("rpc", **self._labels(input_type, 1)):
+            return self.model.predict([inp], inference_params=inference_params, output_config=output_config)
+
+    def predict_by_url(self, url, input_type, inference_params={}, output_config={}):
+        build_input = lambda: Inputs.get_input_from_url(input_id="", **{f"{input_type}_url": url})
+        return self._predict_one(build_input, input_type, inference_params, output_config)
+
+    def predict_by_bytes(self, input_bytes, input_type, inference_params={}, output_config={}):
+        build_input = lambda: Inputs.get_input_from_bytes(input_id="", **{f"{input_type}_bytes": input_bytes})
+        return self._predict_one(build_input, input_type, inference_params, output_config)
+
+    def predict_by_filepath(self, filepath, input_type, inference_params={}, output_config={}):
+        build_input = lambda: Inputs.get_input_from_file(input_id="", **{f"{input_type}_file": filepath})
+        return self._predict_one(build_input, input_type, inference_params, output_config)
+
+metrics = PredictMetrics()
+instrumented_model = InstrumentedModel(
+    get_model("https://clarifai.com/clarifai/main/models/general-image-recognition"), metrics)
+
+for url in image_urls[:10]:
+    response = instrumented_model.predict_by_url(url, "image")
+    with metrics.timer("decode", model_id="general-image-recognition", input_type="image", batch_size=1):
+        top_concepts = [(concept.name, round(concept.value, 4)) for concept in response.outputs[0].data.concepts]
+
+print(metrics.to_openmetrics())
+
+# Profiling the client side of a batch of predictions
+with profile_span(limit=10):
+    for url in image_urls[:5]:
+        instrumented_model.predict_by_url(url, "image")
+
 """## Text
 
 ### Text-to-Text
@@ -100,11 +841,82 @@ Below is an example of how you would send text bytes/filepath and receive predic
 
 # Asking Claude2 to write a tweet on future of AI
 model_url = "https://clarifai.com/anthropic/completion/models/claude-v2"
-model_prediction = Model(model_url).predict_by_bytes(b"Write a tweet on future of AI", input_type="text")
+model_prediction = get_model(model_url).predict_by_bytes(b"Write a tweet on future of AI", input_type="text")
 
 # Get the output
 print(model_prediction.outputs[-1].data.text.raw)
 
+"""#### Streaming text generation
+
+`predict_by_bytes` only returns once the whole completion is generated. For interactive use, `TextStream` yields the text in chunks as the model produces them (through the SDK's `generate_by_bytes` streaming call) and records the time to first token and the time spent waiting for every further chunk. The time your own code spends between chunks (printing, the optional `on_chunk` callback called with every chunk) is not counted in the intervals.
+
+Models that cannot stream (the API answers with an unimplemented / not implemented status) fall back to a regular prediction, yielding the whole completion as a single chunk. Any other error of the streaming call is raised as is, so a failed request is never sent twice.
+"""
+
+STREAMING_UNSUPPORTED_MARKERS = ("NOT_IMPLEMENTED", "RPC_UNKNOWN_METHOD")
+
+def is_streaming_unsupported(error):
+    """Whether `error` means the model does not support streaming predictions."""
+    if isinstance(error, grpc.RpcError) and error.code() == grpc.StatusCode.UNIMPLEMENTED:
+        return True
+    return any(marker in str(error) for marker in STREAMING_UNSUPPORTED_MARKERS)
+
+class TextStream:
+    """Iterate over the text chunks of `model`'s completion of `prompt`, recording latencies."""
+
+    def __init__(self, model, prompt, inference_params={}, on_chunk=None):
+        self.model = model
+        self.prompt = prompt
+        self.inference_params = inference_params
+        self.on_chunk = on_chunk
+        self.streamed = False
+        self.first_token_latency = None # seconds from the request to the first chunk
+        self.chunk_intervals = [] # seconds spent waiting for each further chunk
+        self.total_latency = None
+
+    def _chunks(self):
+        generate = getattr(self.model, "generate_by_bytes", None)
+        if generate is not None:
+            try:
+                responses = iter(generate(self.prompt, "text", inference_params=self.inference_params))
+                first = next(responses)
+            except StopIteration:
+                return
+            except Exception as error:
+                if not is_streaming_unsupported(error):
+                    raise
+            else:
+                self.streamed = True
+                yield first.outputs[0].data.text.raw
+                for response in responses:
+                    yield response.outputs[0].data.text.raw
+                return
+        response = self.model.predict_by_bytes(self.prompt, "text", inference_params=self.inference_params)
+        yield response.outputs[0].data.text.raw
+
+    def __iter__(self):
+        start = requested = time.perf_counter()
+        for chunk in self._chunks():
+            received = time.perf_counter()
+            if self.first_token_latency is None:
+                self.first_token_latency = received - start
+            else:
+                self.chunk_intervals.append(received - requested)
+            if self.on_chunk is not None:
+                self.on_chunk(chunk)
+            yield chunk
+            requested = time.perf_counter() # the consumer's time between chunks is not a model interval
+        self.total_latency = time.perf_counter() - start
+
+stream = TextStream(get_model(model_url), b"Write a tweet on future of AI")
+for chunk in stream:
+    print(chunk, end="", flush=True)
+
+print(f"\n\nStreamed: {stream.streamed}, time to first token: {stream.first_token_latency:.2f} s, "
+      f"total: {stream.total_latency:.2f} s")
+if stream.chunk_intervals:
+    print(f"Mean wait per chunk: {sum(stream.chunk_intervals) / len(stream.chunk_intervals) * 1000:.1f} ms")
+
 """#### Predict by FilePath
 
 **Text Classification** - Sentiment Classification for given text input
@@ -113,11 +925,88 @@ print(model_prediction.outputs[-1].data.text.raw)
 # Text sentiment analysis with 3 classes positive, negative, neutral.
 model_url = "https://clarifai.com/erfan/text-classification/models/sentiment-analysis-twitter-roberta-base"
 file_path = "datasets/upload/data/text_files/positive/0_9.txt"
-model_prediction = Model(model_url).predict_by_filepath(file_path, input_type="text")
+model_prediction = get_model(model_url).predict_by_filepath(file_path, input_type="text")
 
 # Get the output
 print(model_prediction.outputs[-1].data.concepts)
 
+"""#### Predicting whole directories
+
+To run a model over a whole directory tree (for example every file under `datasets/upload/data/text_files`), `predict_files` walks a glob pattern lazily, reads each file with a single bulk read, groups the files into batch requests by their total payload size and predicts them with `predict_in_batches`.
+
+Results are appended to a JSONL file as they arrive. That file is also the checkpoint: when a run is interrupted and started again, files already in the results are skipped instead of being predicted again.
+
+A file that can't be read or predicted doesn't stop the run: a failed batch is retried file by file, and files that still fail get a `{"path": ..., "error": ...}` line. They are tried again on the next run, unless `retry_errors=False`.
+"""
+
+import glob
+import hashlib
+import json
+
+def load_finished_paths(results_path, include_errors=False):
+    """Return the set of file paths that already have a result in `results_path`.
+
+    Paths that only have error lines are left out (so they are retried), unless `include_errors`.
+    """
+    finished = set()
+    if os.path.exists(results_path):
+        with open(results_path) as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                    path = result["path"]
+                except (ValueError, KeyError):
+                    continue # partially written last line of an interrupted run
+                if include_errors or "error" not in result:
+                    finished.add(path)
+    return finished
+
+def predict_files(model, pattern, results_path, input_type="text", max_batch_bytes=4 * 2**20,
+                  batch_size=MAX_PREDICT_INPUTS, max_workers=4, inference_params={}, output_config={},
+                  retry_errors=True):
+    """Predict every file matching `pattern`, appending one JSON line per file to `results_path`."""
+    finished = load_finished_paths(results_path, include_errors=not retry_errors)
+    paths = {}
+
+    with open(results_path, "a") as results:
+        def write_result(result):
+            results.write(json.dumps(result) + "\n")
+            results.flush()
+
+        def file_inputs():
+            for path in glob.iglob(pattern, recursive=True):
+                if path in finished or not os.path.isfile(path):
+                    continue
+                try:
+                    with open(path, "rb") as f:
+                        content = f.read()
+                except OSError as error:
+                    write_result({"path": path, "error": repr(error)})
+                    continue
+                input_id = hashlib.md5(path.encode()).hexdigest()
+                paths[input_id] = path
+                yield Inputs.get_input_from_bytes(input_id=input_id, **{f"{input_type}_bytes": content})
+
+        for inp, output in predict_in_batches(model, file_inputs(), batch_size=batch_size,
+                                              max_workers=max_workers, inference_params=inference_params,
+                                              output_config=output_config, max_batch_bytes=max_batch_bytes,
+                                              return_exceptions=True):
+            path = paths.pop(inp.id)
+            if output is None or isinstance(output, Exception):
+                write_result({"path": path, "error": repr(output) if output is not None else "no output returned"})
+                continue
+            write_result({
+                "path": path,
+                "concepts": [{"id": c.id, "name": c.name, "value": c.value} for c in output.data.concepts],
+                "text": output.data.text.raw,
+            })
+
+predict_files(get_model(model_url), "datasets/upload/data/text_files/**/*.txt", "sentiment_results.jsonl")
+
+with open("sentiment_results.jsonl") as f:
+    for line in islice(f, 5):
+        print(line, end="")
+
 """### Text-To-Image
 
 **Image Generation** - Generate an Image from given input Prompt
@@ -125,20 +1014,53 @@ print(model_prediction.outputs[-1].data.concepts)
 
 # Image Generation using Stable Diffusion XL
 model_url = "https://clarifai.com/stability-ai/stable-diffusion-2/models/stable-diffusion-xl"
-model_prediction = Model(model_url).predict_by_bytes(b"A painting of a cat", input_type="text")
+model_prediction = get_model(model_url).predict_by_bytes(b"A painting of a cat", input_type="text")
+
+"""Generated images come back encoded in `outputs[0].data.image.base64`. `decode_output_image` reads the encoded bytes once and decodes them without copying them again: every read of `output.data.image.base64` returns a new copy of the bytes (protobuf's copy can't be avoided from Python), but `np.frombuffer` wraps that copy without another one. RGB order is returned as a reversed view of the BGR pixels rather than a new array, and `out=` writes the decoded RGB pixels into an array you allocated up front (useful when decoding many images of the same size). Pass `reduce=2`, `4` or `8` to let OpenCV decode a downscaled thumbnail directly.
+
+To save generated images, write the encoded bytes as they are with `save_output_image`, there is no need to decode and re-encode them.
+"""
 
-# Display the image
 import numpy as np
 import cv2
 import matplotlib.pyplot as plt
 
-# Base64 image to numpy array
-im_b = model_prediction.outputs[0].data.image.base64
-image_np = np.frombuffer(im_b, np.uint8)
-img_np = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
+REDUCED_COLOR_FLAGS = {
+    1: cv2.IMREAD_COLOR,
+    2: cv2.IMREAD_REDUCED_COLOR_2,
+    4: cv2.IMREAD_REDUCED_COLOR_4,
+    8: cv2.IMREAD_REDUCED_COLOR_8,
+}
+
+def decode_output_image(output, rgb=True, reduce=1, out=None):
+    """Decode the image of a prediction `output` into a NumPy array.
+
+    Args:
+        rgb: return channels in RGB order (a view, no copy) instead of OpenCV's BGR order.
+        reduce: decode at 1/1, 1/2, 1/4 or 1/8 of the original size.
+        out: preallocated uint8 array of the decoded shape to write the pixels into.
+    """
+    # Every read of the field copies the bytes out of the protobuf message, so read it only once;
+    # `np.frombuffer` then wraps that copy without making another one
+    encoded = np.frombuffer(output.data.image.base64, np.uint8)
+    img = cv2.imdecode(encoded, REDUCED_COLOR_FLAGS[reduce])
+    if out is not None:
+        if rgb:
+            return cv2.cvtColor(img, cv2.COLOR_BGR2RGB, dst=out)
+        np.copyto(out, img)
+        return out
+    return img[..., ::-1] if rgb else img
+
+def save_output_image(output, path):
+    """Write the image of a prediction `output` to `path` in its original encoding."""
+    with open(path, "wb") as f:
+        f.write(output.data.image.base64)
+
+# Display the image
+img_np = decode_output_image(model_prediction.outputs[0])
 
 plt.axis('off')
-plt.imshow(img_np[...,::-1])
+plt.imshow(img_np)
 
 """### Text-To-Audio
 Generate Audio from given text
@@ -146,7 +1068,7 @@ Generate Audio from given text
 
 model_url = "https://clarifai.com/eleven-labs/audio-generation/models/speech-synthesis"
 
-model_prediction = Model(model_url).predict_by_bytes(b"Hello, How are you doing today!", "text")
+model_prediction = get_model(model_url).predict_by_bytes(b"Hello, How are you doing today!", "text")
 
 # Save the audio file
 with open('output_audio.wav', mode='bx') as f:
@@ -161,7 +1083,7 @@ with open('output_audio.wav', mode='bx') as f:
 
 model_url = "https://clarifai.com/salesforce/blip/models/general-english-image-caption-blip"
 image_url = "https://s3.amazonaws.com/samples.clarifai.com/featured-models/image-captioning-statue-of-liberty.jpeg"
-model_prediction = Model(model_url).predict_by_url(image_url, input_type="image")
+model_prediction = get_model(model_url).predict_by_url(image_url, input_type="image")
 
 # Get the output
 print(model_prediction.outputs[0].data.text.raw)
@@ -181,11 +1103,59 @@ Below is an example of how you would send image URLs and receive predictions fro
 
 model_url = "https://clarifai.com/clarifai/main/models/general-image-recognition"
 image_url = "https://samples.clarifai.com/metro-north.jpg"
-model_prediction = Model(model_url).predict_by_url(image_url, input_type="image")
+model_prediction = get_model(model_url).predict_by_url(image_url, input_type="image")
 
 # Get the output
 print(model_prediction.outputs[0].data)
 
+"""**Resizing images before upload**
+
+`predict_by_bytes` and `predict_by_filepath` upload images at their original resolution, while models like `general-image-recognition` and `general-image-detection` resize them server-side anyway. Downscaling large photos to a model-appropriate longest side and re-encoding them before upload cuts the bytes sent and the end-to-end latency, especially on bandwidth-bound machines. Detection bounding boxes are normalized to the image size, so they stay valid for the original image.
+
+`preprocess_images` runs the resizing in a thread pool. OpenCV releases the GIL while decoding, resizing and encoding, so the work still spreads across CPU cores, without pickling images to worker processes or forking a process that has open gRPC channels (worker processes also can't find functions defined in a notebook under the `spawn` start method used on macOS and Windows). It accepts encoded image bytes or file paths (files are read inside the worker threads).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import cv2
+import numpy as np
+
+def downscale_image_bytes(image, max_side=1024, ext=".jpg", quality=90):
+    """Downscale an encoded image (bytes or file path) to at most `max_side` pixels and re-encode it as `ext`."""
+    if isinstance(image, str):
+        with open(image, "rb") as f:
+            image = f.read()
+    img = cv2.imdecode(np.frombuffer(image, np.uint8), cv2.IMREAD_COLOR)
+    height, width = img.shape[:2]
+    scale = max_side / max(height, width)
+    if scale >= 1:
+        return image # already small enough, re-encoding would only lose quality
+    img = cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    quality_flag = cv2.IMWRITE_WEBP_QUALITY if ext == ".webp" else cv2.IMWRITE_JPEG_QUALITY
+    _, encoded = cv2.imencode(ext, img, [quality_flag, quality])
+    return encoded.tobytes()
+
+def preprocess_images(images, max_workers=os.cpu_count(), **kwargs):
+    """Lazily yield `downscale_image_bytes(image, **kwargs)` for every image, computed in a thread pool."""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        yield from executor.map(partial(downscale_image_bytes, **kwargs), images)
+
+"""Comparing upload size and latency for the original and the downscaled images"""
+
+from urllib.request import urlopen
+
+model = get_model("https://clarifai.com/clarifai/main/models/general-image-recognition")
+originals = [urlopen(url).read() for url in image_urls[:3]]
+resized = list(preprocess_images(originals, max_side=512, quality=85))
+
+for name, images in (("Original", originals), ("Downscaled", resized)):
+    start = time.perf_counter()
+    for image in images:
+        model.predict_by_bytes(image, input_type="image")
+    latency = (time.perf_counter() - start) / len(images)
+    print(f"{name}: {sum(map(len, images)) / 1024:.0f} KiB uploaded, {latency * 1000:.0f} ms per prediction")
+
 """**Visual Detection**
 
 **Input**: Image
@@ -203,26 +1173,91 @@ Below is an example of how you would perform visual detection using the Clarifai
 
 DETECTION_IMAGE_URL = 'https://s3.amazonaws.com/samples.clarifai.com/featured-models/general-elephants.jpg'
 
-detector_model = Model("https://clarifai.com/clarifai/main/models/general-image-detection")
+detector_model = get_model("https://clarifai.com/clarifai/main/models/general-image-detection")
 
 prediction_response = detector_model.predict_by_url(DETECTION_IMAGE_URL, input_type="image")
 
-# Since we have one input, one output will exist here
-regions = prediction_response.outputs[0].data.regions
+"""Walking `regions` attribute by attribute is slow when there are thousands of regions across a batch. `regions_to_arrays` reads every region of every output once and returns columnar NumPy arrays (one row per region concept), so scaling, thresholding and NMS can all run vectorized without touching protobuf objects again."""
 
-for region in regions:
-    # Accessing and rounding the bounding box values
-    top_row = round(region.region_info.bounding_box.top_row, 3)
-    left_col = round(region.region_info.bounding_box.left_col, 3)
-    bottom_row = round(region.region_info.bounding_box.bottom_row, 3)
-    right_col = round(region.region_info.bounding_box.right_col, 3)
+from collections import namedtuple
 
-    for concept in region.data.concepts:
-        # Accessing and rounding the concept value
-        name = concept.name
-        value = round(concept.value, 4)
+import numpy as np
 
-        print((f"{name}: {value} BBox: {top_row}, {left_col}, {bottom_row}, {right_col}"))
+Detections = namedtuple("Detections", ["boxes", "concept_ids", "concept_names", "scores", "input_index"])
+
+def regions_to_arrays(outputs):
+    """Decode the regions of `outputs` into `Detections` arrays in a single pass.
+
+    `boxes` is an N x 4 float32 array of normalized `(top_row, left_col, bottom_row, right_col)`
+    and `input_index` maps every row back to the output (input) it came from.
+    """
+    boxes, concept_ids, concept_names, scores, input_index = [], [], [], [], []
+    for i, output in enumerate(outputs):
+        for region in output.data.regions:
+            bbox = region.region_info.bounding_box
+            box = (bbox.top_row, bbox.left_col, bbox.bottom_row, bbox.right_col)
+            for concept in region.data.concepts:
+                boxes.append(box)
+                concept_ids.append(concept.id)
+                concept_names.append(concept.name)
+                scores.append(concept.value)
+                input_index.append(i)
+    return Detections(boxes=np.array(boxes, dtype=np.float32).reshape(-1, 4),
+                      concept_ids=np.array(concept_ids, dtype=object),
+                      concept_names=np.array(concept_names, dtype=object),
+                      scores=np.array(scores, dtype=np.float32),
+                      input_index=np.array(input_index, dtype=np.int32))
+
+def select_detections(detections, keep):
+    """Index every array of `detections` with the same boolean mask or index array."""
+    return Detections(*(array[keep] for array in detections))
+
+def threshold_detections(detections, min_score):
+    """Keep only the detections scoring at least `min_score`."""
+    return select_detections(detections, detections.scores >= min_score)
+
+def scale_boxes(boxes, image_shape):
+    """Scale normalized boxes to integer pixel coordinates of an image of `image_shape`."""
+    height, width = image_shape[:2]
+    return (boxes * np.array([height, width, height, width], dtype=np.float32)).astype(np.int32)
+
+def nms(boxes, scores, iou_threshold=0.5, groups=None):
+    """Greedy non-maximum suppression, returns the indices of the boxes to keep.
+
+    With `groups` (an integer per box), boxes only suppress other boxes of the same group.
+    """
+    if groups is not None and len(boxes):
+        # Move every group to its own area of the plane, so boxes of different groups never overlap
+        offsets = groups.astype(np.float64) * (boxes.max() - boxes.min() + 1)
+        boxes = boxes.astype(np.float64) + offsets[:, None]
+    top, left, bottom, right = boxes.T
+    areas = (bottom - top) * (right - left)
+    order = np.argsort(-scores)
+    keep = []
+    while order.size:
+        best, rest = order[0], order[1:]
+        keep.append(best)
+        overlap_h = np.clip(np.minimum(bottom[best], bottom[rest]) - np.maximum(top[best], top[rest]), 0, None)
+        overlap_w = np.clip(np.minimum(right[best], right[rest]) - np.maximum(left[best], left[rest]), 0, None)
+        intersection = overlap_h * overlap_w
+        iou = intersection / (areas[best] + areas[rest] - intersection + 1e-9)
+        order = rest[iou <= iou_threshold]
+    return np.array(keep, dtype=np.int64)
+
+def detection_groups(detections):
+    """One integer group per `(input_index, concept_id)` pair, so NMS runs per image and per concept."""
+    _, concept_codes = np.unique(detections.concept_ids, return_inverse=True)
+    return detections.input_index.astype(np.int64) * (len(concept_codes) + 1) + concept_codes
+
+def nms_detections(detections, iou_threshold=0.5):
+    """Keep the `detections` that survive NMS within their image and concept."""
+    keep = nms(detections.boxes, detections.scores, iou_threshold, groups=detection_groups(detections))
+    return select_detections(detections, keep)
+
+detections = regions_to_arrays(prediction_response.outputs)
+
+for name, value, box in zip(detections.concept_names, detections.scores.round(4), detections.boxes.round(3)):
+    print(f"{name}: {value} BBox: {box[0]}, {box[1]}, {box[2]}, {box[3]}")
 
 # Uncomment this line to print the full Response JSON
 # print(output)
@@ -236,20 +1271,16 @@ req = urlopen(DETECTION_IMAGE_URL)
 arr = np.asarray(bytearray(req.read()), dtype=np.uint8)
 img = cv2.imdecode(arr, -1) # 'Load it as it is'
 
-for region in regions:
-    # Accessing and rounding the bounding box values
-    top_row = round(region.region_info.bounding_box.top_row, 3) * img.shape[0]
-    left_col = round(region.region_info.bounding_box.left_col, 3)* img.shape[1]
-    bottom_row = round(region.region_info.bounding_box.bottom_row, 3)* img.shape[0]
-    right_col = round(region.region_info.bounding_box.right_col, 3)* img.shape[1]
-
-    cv2.rectangle(img, (int(left_col),int(top_row)), (int(right_col),int(bottom_row)), (36,255,12), 2)
+# Drop weak and overlapping boxes, then scale all of them to pixels at once
+detections = threshold_detections(detections, min_score=0.5)
+detections = nms_detections(detections)
+pixel_boxes = scale_boxes(detections.boxes, img.shape)
 
-    # Get concept name
-    concept_name = region.data.concepts[0].name
+for (top_row, left_col, bottom_row, right_col), concept_name in zip(pixel_boxes.tolist(), detections.concept_names):
+    cv2.rectangle(img, (left_col, top_row), (right_col, bottom_row), (36,255,12), 2)
 
     # Display text
-    cv2.putText(img, concept_name, (int(left_col),int(top_row-10)), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36,255,12), 2)
+    cv2.putText(img, concept_name, (left_col, top_row-10), cv2.FONT_HERSHEY_SIMPLEX, 0.5, (36,255,12), 2)
 
 plt.axis('off')
 plt.imshow(img[...,::-1])
@@ -269,7 +1300,7 @@ Below is an example of how you would perform visual segmentation using the Clari
 
 SEGMENT_IMAGE_URL = 'https://s3.amazonaws.com/samples.clarifai.com/featured-models/general-elephants.jpg'
 
-segmentor_model = Model("https://clarifai.com/clarifai/main/models/image-general-segmentation")
+segmentor_model = get_model("https://clarifai.com/clarifai/main/models/image-general-segmentation")
 
 prediction_response = segmentor_model.predict_by_url(SEGMENT_IMAGE_URL, input_type="image")
 
@@ -282,71 +1313,117 @@ for region in regions:
         value = round(concept.value, 4)
         print((f"{name}: {value}"))
 
-# Display the predicted masks
+"""Decoding every mask into its own full-size overlay and blending them one at a time costs one image worth of memory and one full-frame blend per region. Instead, regions are filtered on their concept value before anything is decoded, the remaining masks are decoded in a thread pool straight into a single `uint16` label map (one label per region), and all masks are blended in one vectorized pass through a color lookup table."""
+
+from concurrent.futures import ThreadPoolExecutor
+
 import cv2
-from urllib.request import urlopen
 import numpy as np
-from PIL import Image as PILImage
-from io import BytesIO
-import random
+
+def decode_mask(region, shape):
+    """Decode a region's mask image into a boolean array of `shape` (height, width)."""
+    mask = cv2.imdecode(np.frombuffer(region.region_info.mask.image.base64, np.uint8), cv2.IMREAD_GRAYSCALE)
+    if mask.shape != shape:
+        mask = cv2.resize(mask, (shape[1], shape[0]), interpolation=cv2.INTER_NEAREST)
+    return mask > 0
+
+def masks_to_label_map(regions, shape, min_value=0.05, max_workers=8):
+    """Build a `uint16` label map of `shape` from the masks of `regions` scoring above `min_value`.
+
+    Pixel value `i + 1` belongs to the i-th returned concept, 0 is background.
+    """
+    kept = [region for region in regions if region.data.concepts[0].value > min_value]
+    label_map = np.zeros(shape[:2], dtype=np.uint16)
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        masks = executor.map(lambda region: decode_mask(region, shape[:2]), kept)
+        for label, mask in enumerate(masks, start=1):
+            label_map[mask] = label
+    return label_map, [region.data.concepts[0].name for region in kept]
+
+def composite_label_map(img, label_map, color_lut, alpha=0.15):
+    """Alpha blend `color_lut[label]` over every labelled pixel of `img` in a single pass."""
+    overlayed = img.copy()
+    labelled = label_map > 0
+    colors = color_lut[label_map[labelled]].astype(np.float32)
+    overlayed[labelled] = (img[labelled] * (1 - alpha) + colors * alpha).astype(np.uint8)
+    return overlayed
+
+def random_color_lut(n_labels, seed=None):
+    """Random BGR colors for labels 1..n_labels, row 0 (background) is black."""
+    lut = np.zeros((n_labels + 1, 3), dtype=np.uint8)
+    lut[1:] = np.random.default_rng(seed).integers(0, 256, size=(n_labels, 3), dtype=np.uint8)
+    return lut
+
+# Display the predicted masks
+from urllib.request import urlopen
 import matplotlib.pyplot as plt
 import matplotlib.patches as mpatches
 
 req = urlopen(SEGMENT_IMAGE_URL)
 arr = np.asarray(bytearray(req.read()), dtype=np.uint8)
-img = cv2.imdecode(arr, -1) # 'Load it as it is'
-
-masks = []
-concepts = []
-for region in regions:
-  if region.data.concepts[0].value > 0.05:
-    masks.append(np.array(PILImage.open(BytesIO(region.region_info.mask.image.base64))))
-    concepts.append(region.data.concepts[0].name)
-
-
-# Generate random colors
-colors = []
-for i in range(len(masks)):
-  r = random.randint(0,255)
-  g = random.randint(0,255)
-  b = random.randint(0,255)
-  colors.append((b,g,r))
-
-# Map masks to overlays
-overlays = []
-for i in range(len(masks)):
-  mask = masks[i]
-  color = colors[i]
-
-  overlay = np.zeros_like(img)
-  overlay[mask > 0] = color
-
-  overlays.append(overlay)
-
-# Overlay masks on original image
-overlayed = np.copy(img)
-
-for overlay in overlays:
-  # Apply alpha blending
-  cv2.addWeighted(overlay, 0.15, overlayed, 0.85, 0, overlayed)
-
-overlayed = cv2.convertScaleAbs(overlayed, alpha=1.5, beta=50)
+img = cv2.imdecode(arr, cv2.IMREAD_COLOR)
 
+label_map, concepts = masks_to_label_map(regions, img.shape, min_value=0.05)
+color_lut = random_color_lut(len(concepts))
+overlayed = composite_label_map(img, label_map, color_lut, alpha=0.5)
 
 # Display overlayed image
-plt.imshow(overlayed)
+plt.imshow(overlayed[...,::-1])
 
 # Create legend with colors and concepts
-legend_items = []
-for i in range(len(overlays)):
-  color = [c/255 for c in colors[i]]
-  concept = concepts[i]
-  legend_items.append(mpatches.Patch(color=color, label=concept))
+legend_items = [mpatches.Patch(color=color_lut[i][::-1] / 255, label=concept)
+                for i, concept in enumerate(concepts, start=1)]
 
 plt.legend(handles=legend_items, loc='lower left', bbox_to_anchor=(1.05, 0))
 plt.axis('off')
 plt.show()
 
+"""Comparing time and peak memory of per-mask overlays against the label map for 50 to 500 synthetic masks"""
+
+import tracemalloc
+
+def per_mask_overlays(img, masks, colors):
+    overlayed = np.copy(img)
+    overlays = []
+    for mask, color in zip(masks, colors):
+        overlay = np.zeros_like(img)
+        overlay[mask] = color
+        overlays.append(overlay)
+    for overlay in overlays:
+        cv2.addWeighted(overlay, 0.15, overlayed, 0.85, 0, overlayed)
+    return overlayed
+
+def single_pass(img, masks, color_lut):
+    label_map = np.zeros(img.shape[:2], dtype=np.uint16)
+    for label, mask in enumerate(masks, start=1):
+        label_map[mask] = label
+    return composite_label_map(img, label_map, color_lut)
+
+def measure(fn, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 2**20
+
+rng = np.random.default_rng(0)
+bench_img = rng.integers(0, 256, size=(720, 1280, 3), dtype=np.uint8)
+for n_masks in (50, 200, 500):
+    masks = []
+    for _ in range(n_masks):
+        mask = np.zeros(bench_img.shape[:2], dtype=bool)
+        top, left = rng.integers(0, 620), rng.integers(0, 1180)
+        mask[top:top + 100, left:left + 100] = True
+        masks.append(mask)
+    color_lut = random_color_lut(n_masks, seed=0)
+
+    old_ms, old_mb = measure(per_mask_overlays, bench_img, masks, color_lut[1:])
+    new_ms, new_mb = measure(single_pass, bench_img, masks, color_lut)
+    print(f"{n_masks} masks: per-mask overlays {old_ms:.0f} ms / {old_mb:.0f} MiB, "
+          f"label map {new_ms:.0f} ms / {new_mb:.0f} MiB")
+
 """## Video
 
 Here's an example of inference on video input where we also define `sample_ms` parameter to run prediction every 2000ms
@@ -354,7 +1431,7 @@ Here's an example of inference on video input where we also define `sample_ms` p
 
 BEER_VIDEO_URL = "https://samples.clarifai.com/beer.mp4"
 
-model = Model("https://clarifai.com/clarifai/main/models/general-image-recognition")
+model = get_model("https://clarifai.com/clarifai/main/models/general-image-recognition")
 
 output_config={
           "sample_ms": 2000 #Run inference every 2 seconds
@@ -365,6 +1442,51 @@ model_prediction = model.predict_by_url(BEER_VIDEO_URL, input_type="video", outp
 for frame in model_prediction.outputs[0].data.frames:
     print(f"Frame Info: {frame.frame_info} Concept: {frame.data.concepts[0].name}\n")
 
+"""### Streaming video predictions
+
+`predict_by_url(..., input_type="video")` only returns once the whole video is processed, and the response holds every frame at once. For long videos, the frames can instead be sampled client-side every `sample_ms` and predicted as images with `predict_in_batches`.
+
+`stream_video_predictions` is a generator: it yields each frame's `frame_info` and concepts as soon as its batch is done, while later frames are still being read and predicted. Only a few batches of frames are in memory at any time, no matter how long the video is. It works for local files as well as video URLs.
+"""
+
+import cv2
+from clarifai_grpc.grpc.api import resources_pb2
+
+def sample_video_frames(video, sample_ms=2000, jpeg_quality=90):
+    """Lazily yield `(frame_info, jpeg_bytes)` for one frame every `sample_ms` milliseconds."""
+    capture = cv2.VideoCapture(video)
+    next_time = 0
+    index = 0
+    try:
+        while capture.grab():
+            frame_time = capture.get(cv2.CAP_PROP_POS_MSEC)
+            if frame_time >= next_time:
+                _, frame = capture.retrieve()
+                _, jpeg = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality])
+                yield resources_pb2.FrameInfo(index=index, time=int(frame_time)), jpeg.tobytes()
+                # Next multiple of sample_ms, so a jump in timestamps doesn't make every following frame due
+                next_time = (frame_time // sample_ms + 1) * sample_ms
+            index += 1
+    finally:
+        capture.release()
+
+def stream_video_predictions(model, video, sample_ms=2000, batch_size=32, max_workers=4, output_config={}):
+    """Yield `(frame_info, concepts)` for every sampled frame of `video`, in frame order."""
+    frame_infos = {}
+
+    def frame_inputs():
+        for frame_info, jpeg in sample_video_frames(video, sample_ms):
+            input_id = str(frame_info.index)
+            frame_infos[input_id] = frame_info
+            yield Inputs.get_input_from_bytes(input_id=input_id, image_bytes=jpeg)
+
+    for inp, output in predict_in_batches(model, frame_inputs(), batch_size=batch_size,
+                                          max_workers=max_workers, output_config=output_config):
+        yield frame_infos.pop(inp.id), output.data.concepts
+
+for frame_info, concepts in stream_video_predictions(model, BEER_VIDEO_URL, sample_ms=2000):
+    print(f"Frame Info: {frame_info} Concept: {concepts[0].name}\n")
+
 """## Audio
 
 ### Audio to Text
@@ -374,11 +1496,123 @@ Transcribe Audio to text
 
 audio_url = "https://s3.amazonaws.com/samples.clarifai.com/GoodMorning.wav"
 model_url = "https://clarifai.com/facebook/asr/models/asr-wav2vec2-large-robust-ft-swbd-300h-english"
-model_prediction = Model(model_url).predict_by_url(audio_url, "audio")
+model_prediction = get_model(model_url).predict_by_url(audio_url, "audio")
 
 # Print the output
 print(model_prediction.outputs[0].data.text.raw)
 
+"""### Transcribing long recordings
+
+Sending a long recording in a single request runs into request size and time limits and gives no output until the very end. `transcribe_long_audio` splits a local WAV file into overlapping windows, moving each cut to the quietest point near the window end so words are rarely split. It transcribes the windows concurrently and yields timestamped segments in order as soon as they are ready. Words repeated in the overlap between two windows are removed when the text is stitched together, so wall-clock time scales with the number of workers rather than the length of the recording.
+
+*Note: only uncompressed PCM WAV files with 8, 16, 24 or 32-bit integer samples are supported*
+"""
+
+import io
+import re
+import wave
+from collections import namedtuple
+
+TranscriptSegment = namedtuple("TranscriptSegment", ["start", "end", "text"]) # start / end in seconds
+
+WAV_SAMPLE_TYPES = {1: np.uint8, 2: np.int16, 4: np.int32}
+
+def _wav_samples(frames, sampwidth, nchannels):
+    """Decode PCM WAV `frames` into an `(n_frames, nchannels)` integer array."""
+    if sampwidth == 3:
+        # 24-bit little-endian samples: put them in the high bytes of an int32, the shift back keeps the sign
+        padded = np.zeros((len(frames) // 3, 4), dtype=np.uint8)
+        padded[:, 1:] = np.frombuffer(frames, np.uint8).reshape(-1, 3)
+        return (padded.view("<i4") >> 8).reshape(-1, nchannels)
+    if sampwidth not in WAV_SAMPLE_TYPES:
+        raise ValueError(f"Unsupported WAV sample width of {sampwidth} bytes, only 1, 2, 3 and 4 are supported")
+    return np.frombuffer(frames, WAV_SAMPLE_TYPES[sampwidth]).reshape(-1, nchannels)
+
+def split_on_silence(samples, rate, window_s=30.0, overlap_s=1.0, search_s=3.0, block_s=0.02):
+    """Return `(start, end)` sample ranges of overlapping windows, cut at the quietest block near each window end.
+
+    Cuts are only searched after the overlap with the previous window, so every window starts at least
+    `window_s - overlap_s - search_s` seconds (and at least one block) after the previous one.
+    """
+    window, overlap, search = int(window_s * rate), int(overlap_s * rate), int(search_s * rate)
+    if window <= overlap:
+        raise ValueError(f"window_s ({window_s}) must be longer than overlap_s ({overlap_s})")
+    mono = samples.reshape(len(samples), -1).astype(np.float32).mean(axis=1)
+    block = max(1, int(block_s * rate))
+    n_blocks = len(mono) // block
+    energy = np.sqrt((mono[:n_blocks * block].reshape(n_blocks, block) ** 2).mean(axis=1))
+
+    windows, start = [], 0
+    while True:
+        end = start + window
+        if end >= len(mono):
+            windows.append((start, len(mono)))
+            return windows
+        # First whole block after the search start, never inside the overlap with the previous window
+        first_block = -(-max(end - search, start + overlap + block) // block)
+        last_block = min(end // block, n_blocks)
+        if last_block > first_block:
+            end = (first_block + int(np.argmin(energy[first_block:last_block]))) * block + block // 2
+        windows.append((start, end))
+        start = end - overlap
+
+def _wav_bytes(frames, params):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setparams(params)
+        wav.writeframes(frames)
+    return buffer.getvalue()
+
+def _dedupe_overlap(previous_text, text, max_words=20):
+    """Drop the words at the start of `text` that repeat the end of `previous_text`."""
+    normalize = lambda word: re.sub(r"\W", "", word.lower())
+    previous = [normalize(word) for word in previous_text.split()[-max_words:]]
+    words = text.split()
+    current = [normalize(word) for word in words[:max_words]]
+    for n in range(min(len(previous), len(current)), 0, -1):
+        if previous[-n:] == current[:n]:
+            return " ".join(words[n:])
+    return text
+
+def transcribe_long_audio(model, wav_path, window_s=30.0, overlap_s=1.0, max_workers=4, inference_params={}):
+    """Yield a `TranscriptSegment` per window of the WAV file at `wav_path`, in order."""
+    with wave.open(wav_path, "rb") as wav:
+        params = wav.getparams()
+        frames = wav.readframes(params.nframes)
+    frame_size = params.sampwidth * params.nchannels
+    samples = _wav_samples(frames, params.sampwidth, params.nchannels)
+    windows = split_on_silence(samples, params.framerate, window_s, overlap_s)
+
+    inputs = (Inputs.get_input_from_bytes(input_id=str(i),
+                                          audio_bytes=_wav_bytes(frames[start * frame_size:end * frame_size], params))
+              for i, (start, end) in enumerate(windows))
+    previous_text = ""
+    for inp, output in predict_in_batches(model, inputs, batch_size=1, max_workers=max_workers,
+                                          inference_params=inference_params):
+        start, end = windows[int(inp.id)]
+        text = _dedupe_overlap(previous_text, output.data.text.raw)
+        previous_text = output.data.text.raw
+        yield TranscriptSegment(start / params.framerate, end / params.framerate, text)
+
+# Windows must cover the whole recording and always move forward, also with windows shorter than the search
+rate, search_s = 16000, 3.0
+rng = np.random.default_rng(0)
+for seconds, window_s, overlap_s in ((3, 2.0, 0.5), (10, 2.0, 0.5), (20, 3.5, 1.0), (600, 30.0, 1.0)):
+    signal = rng.integers(-1000, 1000, size=seconds * rate, dtype=np.int16)
+    for quiet in rng.integers(0, len(signal) - 320, size=seconds * 2):
+        signal[quiet:quiet + 320] = 0 # short pauses all over the recording
+    windows = split_on_silence(signal, rate, window_s, overlap_s, search_s)
+    starts, ends = np.array(windows).T
+    assert starts[0] == 0 and ends[-1] == len(signal) and (starts[1:] <= ends[:-1]).all()
+    assert (np.diff(starts) >= max(1, (window_s - overlap_s - search_s) * rate)).all()
+    print(f"{seconds} s recording, {window_s} s windows: {len(windows)} windows")
+
+with open("GoodMorning.wav", "wb") as f:
+    f.write(urlopen(audio_url).read())
+
+for segment in transcribe_long_audio(get_model(model_url), "GoodMorning.wav", window_s=2.0, overlap_s=0.5):
+    print(f"[{segment.start:6.2f}s - {segment.end:6.2f}s] {segment.text}")
+
 """## Prediction Parameters
 You can set additional parameters to gain flexibility in the predict operation.
 
@@ -392,12 +1626,12 @@ Some of the parameters for text-to-text LLMs are: <br>
 **Top K** (top_k) - Controls output diversity by limiting vocab to top K likely tokens per step. Lower K gives more focused results while higher K increases variety.
 
 Possible parameters for a model can be found in `OutputInfo Params` obtained by printing the model object. <br>
-`print(Model("https://clarifai.com/segmind/segmind-stable-diffusion/models/ssd-1b"))`
+`print(model_registry.describe("https://clarifai.com/segmind/segmind-stable-diffusion/models/ssd-1b"))`
 
 ##### Setting `temperature`, `max_tokens` for GPT-4
 """
 
-gpt_4_model = Model("https://clarifai.com/openai/chat-completion/models/GPT-4")
+gpt_4_model = get_model("https://clarifai.com/openai/chat-completion/models/GPT-4")
 
 query_text = """What is the best way to invest my money? I have a 401(k) and a Roth IRA.
 I also have a savings account. I want to make sure I am doing the best I can for my money"""
@@ -410,7 +1644,7 @@ print(gpt_4_model.predict_by_bytes(input_bytes=bytes(query_text, 'utf-8'),
 """##### Setting output `Height` and `Width` for image generation using Segmind-Stable-Diffusion model"""
 
 inference_params = dict(height=512, width=512)
-ssd_model = Model("https://clarifai.com/segmind/segmind-stable-diffusion/models/ssd-1b")
+ssd_model = get_model("https://clarifai.com/segmind/segmind-stable-diffusion/models/ssd-1b")
 
 prompt = '''with smoke, half ice and half fire and ultra realistic in detail.wolf,
 typography, dark fantasy, wildlife photography, vibrant, cinematic and on a black background'''
@@ -420,22 +1654,15 @@ model_prediction = ssd_model.predict_by_bytes(input_bytes=bytes(prompt, 'utf-8')
                                             inference_params=inference_params)
 
 # Display the image
-import numpy as np
-import cv2
-import matplotlib.pyplot as plt
-
-# Base64 image to numpy array
-im_b = model_prediction.outputs[0].data.image.base64
-image_np = np.frombuffer(im_b, np.uint8)
-img_np = cv2.imdecode(image_np, cv2.IMREAD_COLOR)
+img_np = decode_output_image(model_prediction.outputs[0])
 
 plt.axis('off')
-plt.imshow(img_np[...,::-1])
+plt.imshow(img_np)
 
 """#### Setting `task` for Audio Speech Recognition model Whisper"""
 
 inference_params = dict(task="translate")
-whisper_model = Model("https://clarifai.com/openai/whisper/models/whisper-large-v2")
+whisper_model = get_model("https://clarifai.com/openai/whisper/models/whisper-large-v2")
 
 spanish_audio_url = "https://s3.amazonaws.com/samples.clarifai.com/featured-models/record_out+(3).wav"
 model_prediction = whisper_model.predict_by_url(spanish_audio_url, "audio", inference_params=inference_params)
@@ -468,7 +1695,7 @@ selected_concepts = [
       resources_pb2.Concept(name="cat"),
   ]
 output_config={"select_concepts": selected_concepts}
-model = Model(Model_URL)
+model = get_model(Model_URL)
 
 model_prediction = model.predict_by_url(DOG_IMAGE_URL, input_type="image", output_config=output_config)
 
@@ -482,7 +1709,7 @@ Setting the `max_concepts` parameter will customize how many concepts and their
 If not specified, the predict endpoint will return the top 20 concepts
 """
 
-model = Model(Model_URL)
+model = get_model(Model_URL)
 output_config={"max_concepts": 3}
 model_prediction = model.predict_by_url(DOG_IMAGE_URL, input_type="image", output_config=output_config)
 
@@ -496,13 +1723,121 @@ This parameter lets you set a minimum probability threshold for the outputs you
 For example if you want to see all concepts with a probability score of .95 or higher, this parameter will allow you to accomplish that.
 """
 
-model = Model(Model_URL)
+model = get_model(Model_URL)
 output_config={"min_value": 0.95}
 model_prediction = model.predict_by_url(DOG_IMAGE_URL, input_type="image", output_config=output_config)
 
 # Print the output
 print(model_prediction.outputs[0].data.concepts)
 
+"""#### Keeping only the fields you need
+
+A predict response carries much more than the predictions: the status, the model and its metadata, and an echo of every input. The SDK parses all of it into protobuf objects, even when only `outputs[...].data.concepts` or `.text.raw` is read afterwards. `ProjectedModel` sends the same predict request over its own gRPC channel, but parses the response into a trimmed message type holding only `outputs[...].status`, `outputs[...].input.id` and the `fields` of `outputs[...].data` you ask for (any `Data` field, like `concepts`, `text`, `image`, `regions` or `frames`).
+
+Everything else is skipped while parsing, so none of its submessages are built. Protobuf keeps skipped fields as unknown fields, so `ProjectedModel` discards them before returning: the input echoes (including the bytes of uploaded inputs) and the model metadata are not kept in memory, only the requested predictions are. The trimmed response is read with the same attribute paths as a full one, and it also works with `predict_in_batches`.
+"""
+
+from functools import lru_cache
+
+from google.protobuf import descriptor_pb2, descriptor_pool, message_factory
+from clarifai_grpc.grpc.api.status import status_pb2
+
+def _add_trimmed_message(file_proto, name, message_type, fields, type_names={}):
+    """Add a copy of `message_type` called `name` to `file_proto`, with only `fields`."""
+    message = file_proto.message_type.add()
+    message_type.DESCRIPTOR.CopyToProto(message)
+    kept = [field for field in message.field if field.name in fields]
+    for field in kept:
+        field.ClearField("oneof_index")
+        if field.name in type_names:
+            field.type_name = type_names[field.name]
+    del message.field[:], message.oneof_decl[:], message.nested_type[:], message.enum_type[:]
+    message.field.extend(kept)
+    message.name = name
+
+@lru_cache(maxsize=None)
+def trimmed_response_type(fields):
+    """Message class that parses a `MultiOutputResponse` keeping only `fields` of every output's data."""
+    package = "trimmed_" + "_".join(sorted(fields))
+    file_proto = descriptor_pb2.FileDescriptorProto(
+        name=f"{package}.proto", package=package, syntax="proto3",
+        dependency=[resources_pb2.DESCRIPTOR.name, status_pb2.DESCRIPTOR.name])
+    # Field numbers and types are copied from the real messages, so the wire format is the same
+    _add_trimmed_message(file_proto, "Data", resources_pb2.Data, fields)
+    _add_trimmed_message(file_proto, "Input", resources_pb2.Input, ("id",))
+    _add_trimmed_message(file_proto, "Output", resources_pb2.Output, ("status", "input", "data"),
+                         {"input": f".{package}.Input", "data": f".{package}.Data"})
+    _add_trimmed_message(file_proto, "MultiOutputResponse", service_pb2.MultiOutputResponse, ("status", "outputs"),
+                         {"outputs": f".{package}.Output"})
+    pool = descriptor_pool.Default()
+    pool.AddSerializedFile(file_proto.SerializeToString())
+    return message_factory.GetMessageClass(pool.FindMessageTypeByName(f"{package}.MultiOutputResponse"))
+
+class ProjectedModel:
+    """Predict with `model`, parsing only `fields` of every output's data out of the responses."""
+
+    def __init__(self, model, fields=("concepts",)):
+        self.model_info = model.model_info
+        self.fields = tuple(sorted(fields))
+        self._metadata = model.auth_helper.metadata
+        _, self._channel = model.auth_helper.get_stub_and_channel()
+        self._post_model_outputs = self._channel.unary_unary(
+            "/clarifai.api.V2/PostModelOutputs",
+            request_serializer=service_pb2.PostModelOutputsRequest.SerializeToString,
+            response_deserializer=trimmed_response_type(self.fields).FromString)
+
+    def predict(self, inputs, inference_params={}, output_config={}, timeout=None):
+        request = predict_request(self.model_info, inputs, inference_params, output_config)
+        response = self._post_model_outputs(request, metadata=self._metadata, timeout=timeout)
+        if response.status.code != status_code_pb2.SUCCESS:
+            raise Exception(f"Model Predict failed with response {response.status!r}")
+        response.DiscardUnknownFields() # the raw bytes of everything that wasn't parsed, like input echoes
+        return response
+
+    def predict_by_url(self, url, input_type, inference_params={}, output_config={}):
+        inp = Inputs.get_input_from_url(input_id="", **{f"{input_type}_url": url})
+        return self.predict([inp], inference_params, output_config)
+
+    def predict_by_bytes(self, input_bytes, input_type, inference_params={}, output_config={}):
+        inp = Inputs.get_input_from_bytes(input_id="", **{f"{input_type}_bytes": input_bytes})
+        return self.predict([inp], inference_params, output_config)
+
+    def predict_by_filepath(self, filepath, input_type, inference_params={}, output_config={}):
+        inp = Inputs.get_input_from_file(input_id="", **{f"{input_type}_file": filepath})
+        return self.predict([inp], inference_params, output_config)
+
+    def close(self):
+        self._channel.close()
+
+projected_model = ProjectedModel(model, fields=("concepts",))
+model_prediction = projected_model.predict_by_url(DOG_IMAGE_URL, "image", output_config={"max_concepts": 3})
+print(model_prediction.outputs[0].data.concepts)
+
+"""Comparing parsing time and kept size of the full and the trimmed response, for 32 outputs with 100 detected regions each, the model metadata and a 100 KB uploaded image echoed in every output"""
+
+full_response = service_pb2.MultiOutputResponse(status=status_pb2.Status(code=status_code_pb2.SUCCESS))
+echoed_model = resources_pb2.Model(id="general-image-detection")
+echoed_model.model_version.output_info.data.concepts.extend(
+    resources_pb2.Concept(id=f"concept-{i}", name=f"concept {i}") for i in range(200))
+for i in range(32):
+    echoed_input = resources_pb2.Input(id=str(i), data=resources_pb2.Data(image=resources_pb2.Image(base64=bytes(100_000))))
+    output = full_response.outputs.add(id=str(i), model=echoed_model, input=echoed_input)
+    output.data.concepts.extend(resources_pb2.Concept(id=f"concept-{j}", name=f"concept {j}", value=1 - j / 20)
+                                for j in range(20))
+    for j in range(100):
+        region = output.data.regions.add(data=resources_pb2.Data(concepts=[output.data.concepts[j % 20]]))
+        region.region_info.bounding_box.top_row = j / 100
+serialized = full_response.SerializeToString()
+
+for name, response_type in (("Full response", service_pb2.MultiOutputResponse),
+                            ("Only concepts", trimmed_response_type(("concepts",)))):
+    start = time.perf_counter()
+    for _ in range(100):
+        response = response_type.FromString(serialized)
+        response.DiscardUnknownFields()
+    print(f"{name}: {(time.perf_counter() - start) * 10:.3f} ms per response of {len(serialized) / 1024:.0f} KiB, "
+          f"{response.ByteSize() / 1024:.0f} KiB kept")
+
 """### By Model Version ID
 By specifying model_version_id in your predict call, you can continue to predict on a previous version, for consistent prediction results. Clarifai also updates its pre-built models on a regular basis.
 
@@ -512,13 +1847,218 @@ Below is an example of how you would set a model version ID and receive predicti
 model_version_id = "aa7f35c01e0642fda5cf400f543e7c40"
 model_url = f"https://clarifai.com/clarifai/main/models/general-image-recognition/model_version/{model_version_id}"
 
-model = Model(model_url)
+model = get_model(model_url)
 
 model_prediction = model.predict_by_url(DOG_IMAGE_URL, input_type="image")
 
 # Print the output
 print(model_prediction.outputs[0].data.concepts)
 
+"""#### Caching predictions
+
+A model pinned to a version always gives the same output for the same input and parameters, so repeated predictions can be served from a cache instead of calling the API again, saving both latency and API spend.
+
+`PredictionCache` keys each response on a hash of the input content (the URL, the bytes or the file contents), the model and its version id, `inference_params` and `output_config`. Entries are kept in an in-memory LRU and, if `db_path` is given, in a SQLite file that survives restarts.
+
+Text generation samples a different output on every call unless `temperature` is explicitly 0, so responses with text output are only cached for `temperature=0` (or with `cache_stochastic=True`). Models without a pinned version change whenever Clarifai updates them, so their responses are only kept in memory, for `unpinned_ttl` seconds, and never written to the SQLite file. Whether a model is pinned is passed explicitly with `pinned`, from the URL the model was created with: `model.model_info` can't tell, as it gets the latest version id filled in as soon as anything loads the model info (even `print(model)`).
+"""
+
+import hashlib
+import json
+import sqlite3
+
+from clarifai_grpc.grpc.api import service_pb2
+
+class PredictionCache:
+    """Content-addressed cache of predict responses, in memory with an optional SQLite store."""
+
+    def __init__(self, max_entries=1024, db_path=None, unpinned_ttl=600):
+        self.max_entries = max_entries
+        self.unpinned_ttl = unpinned_ttl # seconds a response of a model without a pinned version stays valid
+        self._entries = OrderedDict() # key -> (serialized response, expiry time or None)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("CREATE TABLE IF NOT EXISTS predictions (key TEXT PRIMARY KEY, response BLOB)")
+
+    @staticmethod
+    def make_key(model, content, input_type, inference_params, output_config):
+        model_info = model.model_info
+        key = hashlib.sha256()
+        key.update(f"{model_info.user_id}/{model_info.app_id}/{model_info.id}/"
+                   f"{model_info.model_version.id}/{input_type}".encode())
+        key.update(content)
+        # select_concepts holds protobuf Concepts, `str` gives their (deterministic) text format
+        key.update(json.dumps([inference_params, output_config], sort_keys=True, default=str).encode())
+        return key.hexdigest()
+
+    def get(self, key):
+        with self._lock:
+            response, expires = self._entries.get(key, (None, None))
+            if expires is not None and time.monotonic() > expires:
+                del self._entries[key]
+                response = None
+            if response is not None:
+                self._entries.move_to_end(key)
+            elif self._db is not None:
+                row = self._db.execute("SELECT response FROM predictions WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    response = row[0]
+                    self._remember(key, response)
+        if response is None:
+            return None
+        return service_pb2.MultiOutputResponse.FromString(response)
+
+    def put(self, key, response, pinned=True):
+        """Cache `response`, only responses of pinned model versions are persisted and never expire."""
+        serialized = response.SerializeToString()
+        with self._lock:
+            self._remember(key, serialized, None if pinned else time.monotonic() + self.unpinned_ttl)
+            if pinned and self._db is not None:
+                self._db.execute("INSERT OR REPLACE INTO predictions VALUES (?, ?)", (key, serialized))
+                self._db.commit()
+
+    def _remember(self, key, serialized, expires=None):
+        self._entries[key] = (serialized, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+prediction_cache = PredictionCache(db_path="predictions_cache.sqlite")
+
+def cached_predict(model, predict_by, content, input_type, inference_params={}, output_config={},
+                   cache=prediction_cache, cache_stochastic=False, pinned=False):
+    """Call `model.predict_by_{predict_by}` ("url", "bytes" or "filepath") through `cache`.
+
+    `pinned` tells whether `model` was created for a fixed model version, e.g.
+    `ModelRegistry.model_key(model_url)[3] is not None`, only then responses are persisted.
+    """
+    predict = partial(getattr(model, f"predict_by_{predict_by}"), content, input_type, inference_params, output_config)
+    temperature = inference_params.get("temperature")
+    if not cache_stochastic and temperature is not None and float(temperature) > 0:
+        return predict()
+
+    if predict_by == "filepath":
+        with open(content, "rb") as f:
+            key_content = f.read()
+    elif predict_by == "url":
+        key_content = content.encode()
+    else:
+        key_content = content
+    key = cache.make_key(model, key_content, input_type, inference_params, output_config)
+
+    response = cache.get(key)
+    if response is None:
+        response = predict()
+        # Without an explicit temperature, text generation samples with the model's default one
+        stochastic = temperature is None and any(output.data.text.raw for output in response.outputs)
+        if cache_stochastic or not stochastic:
+            cache.put(key, response, pinned=pinned)
+    return response
+
+start = time.perf_counter()
+model_prediction = cached_predict(model, "url", DOG_IMAGE_URL, input_type="image",
+                                  pinned=ModelRegistry.model_key(model_url)[3] is not None)
+print(f"First call:  {(time.perf_counter() - start) * 1000:.2f} ms")
+
+start = time.perf_counter()
+model_prediction = cached_predict(model, "url", DOG_IMAGE_URL, input_type="image",
+                                  pinned=ModelRegistry.model_key(model_url)[3] is not None)
+print(f"Cached call: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+print(model_prediction.outputs[0].data.concepts)
+
+"""#### Tuning concept thresholds locally
+
+Trying different `select_concepts`, `max_concepts` and `min_value` settings, as in the Output Config section, costs one API call per setting and input. With a pinned model version the scores never change, so `ConceptScores` fetches the concept vector of every input once (up to `FULL_VECTOR_MAX_CONCEPTS` concepts, with `min_value` 0) and keeps all of them in a single float32 matrix with a column per concept id. `query` then answers any combination of the three settings locally for all inputs at once with a vectorized top-k and threshold.
+
+*Note: concepts outside the fetched top `FULL_VECTOR_MAX_CONCEPTS` of an input are NaN in the matrix and are never returned by `query`, even with `min_value` 0*
+"""
+
+FULL_VECTOR_MAX_CONCEPTS = 200 # largest max_concepts to request when fetching full concept vectors
+
+class ConceptScores:
+    """Concept scores of many inputs in one `(n_inputs, n_concepts)` float32 matrix, NaN where a concept wasn't returned."""
+
+    def __init__(self):
+        self.input_ids = []
+        self.concept_ids = []
+        self.concept_names = []
+        self._columns = {}
+        self._rows = [] # (columns, values) of every input, densified on demand
+        self._matrix = None
+
+    @classmethod
+    def fetch(cls, model, inputs, batch_size=32, max_workers=4):
+        """Predict `inputs` once with `model`, keeping their full concept vectors."""
+        scores = cls()
+        output_config = {"max_concepts": FULL_VECTOR_MAX_CONCEPTS, "min_value": 0.0}
+        for inp, output in predict_in_batches(model, inputs, batch_size=batch_size, max_workers=max_workers,
+                                              output_config=output_config):
+            scores.add(inp.id, output.data.concepts)
+        return scores
+
+    def add(self, input_id, concepts):
+        columns = []
+        for concept in concepts:
+            if concept.id not in self._columns:
+                self._columns[concept.id] = len(self.concept_ids)
+                self.concept_ids.append(concept.id)
+                self.concept_names.append(concept.name)
+            columns.append(self._columns[concept.id])
+        self.input_ids.append(input_id)
+        self._rows.append((np.array(columns, dtype=np.int64), np.array([c.value for c in concepts], dtype=np.float32)))
+        self._matrix = None
+
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            self._matrix = np.full((len(self._rows), len(self.concept_ids)), np.nan, dtype=np.float32)
+            for row, (columns, values) in enumerate(self._rows):
+                self._matrix[row, columns] = values
+        return self._matrix
+
+    def query(self, select_concepts=None, max_concepts=20, min_value=0.0):
+        """Return `[(concept_id, name, value), ...]` per input, like predicting with that `output_config`.
+
+        `select_concepts` can hold concept ids, names or `resources_pb2.Concept`s.
+        """
+        columns = np.arange(len(self.concept_ids))
+        if select_concepts is not None:
+            by_name = {name: column for column, name in enumerate(self.concept_names)}
+            wanted = [getattr(concept, "id", "") or getattr(concept, "name", concept) for concept in select_concepts]
+            columns = np.array([self._columns.get(key, by_name.get(key)) for key in wanted
+                                if key in self._columns or key in by_name], dtype=np.int64)
+        scores = self.matrix[:, columns]
+        k = min(max_concepts, len(columns))
+        if k == 0:
+            return [[] for _ in self.input_ids]
+        # Missing concepts rank last and are dropped below, instead of showing up with a made-up score
+        scores = np.where(np.isnan(scores), -np.inf, scores)
+        top = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+        top_scores = np.take_along_axis(scores, top, axis=1)
+        order = np.argsort(-top_scores, axis=1)
+        top, top_scores = np.take_along_axis(top, order, axis=1), np.take_along_axis(top_scores, order, axis=1)
+        keep = np.isfinite(top_scores) & (top_scores >= min_value)
+        return [[(self.concept_ids[columns[c]], self.concept_names[columns[c]], float(v))
+                 for c, v in zip(row_columns[row_keep], row_scores[row_keep])]
+                for row_columns, row_scores, row_keep in zip(top, top_scores, keep)]
+
+inputs = (Inputs.get_input_from_url(input_id=str(i), image_url=url) for i, url in enumerate([DOG_IMAGE_URL] + image_urls[:2]))
+concept_scores = ConceptScores.fetch(model, inputs)
+
+# The three Output Config examples, answered without calling the API again
+print(concept_scores.query(select_concepts=selected_concepts)[0])
+print(concept_scores.query(max_concepts=3)[0])
+print(concept_scores.query(min_value=0.95)[0])
+
+# Sweeping thresholds over all inputs at once
+for min_value in (0.5, 0.8, 0.95, 0.99):
+    n_concepts = sum(len(concepts) for concepts in concept_scores.query(max_concepts=FULL_VECTOR_MAX_CONCEPTS,
+                                                                       min_value=min_value))
+    print(f"min_value {min_value}: {n_concepts} concepts over {len(concept_scores.input_ids)} inputs")
+
 """## MultiModal Models
 
 ### GPT-4-Vision
@@ -537,10 +2077,595 @@ inference_params = dict(temperature=0.2, max_tokens=100)
 
 inputs = [Inputs.get_multimodal_input(input_id="",image_url=image_url, raw_text=prompt)]
 
-model_prediction = Model("https://clarifai.com/openai/chat-completion/models/openai-gpt-4-vision").predict(inputs,inference_params=inference_params)
+model_prediction = get_model("https://clarifai.com/openai/chat-completion/models/openai-gpt-4-vision").predict(inputs,inference_params=inference_params)
 
 print(model_prediction.outputs[0].data.text.raw)
 
+"""#### Asking the same question about many images
+
+For visual question answering over a large set of images with a fixed prompt, `multimodal_inputs` builds the inputs in bulk: the prompt is turned into a `Text` message once and shared by every input, each input gets a stable `input_id` derived from its image (so duplicate images are only asked about once and results can be correlated across runs), and with `fetch=True` image URLs and files are downloaded / read concurrently and sent as bytes.
+
+`ask_about_images` sends the inputs in batches with `predict_in_batches` and yields `(image, answer)` pairs, mapped back through the input ids.
+"""
+
+from urllib.request import urlopen
+
+def _load_image(source, fetch):
+    if source.startswith(("http://", "https://")):
+        if not fetch:
+            return resources_pb2.Image(url=source)
+        with urlopen(source) as response:
+            return resources_pb2.Image(base64=response.read())
+    with open(source, "rb") as f:
+        return resources_pb2.Image(base64=f.read())
+
+def multimodal_inputs(image_sources, prompt, fetch=False, max_workers=8):
+    """Lazily yield `(image_source, input)` pairs asking `prompt` about every unique image URL or path."""
+    prompt_text = resources_pb2.Text(raw=prompt)
+    seen = set()
+
+    def unique_sources():
+        for source in image_sources:
+            input_id = hashlib.sha1(source.encode()).hexdigest()
+            if input_id not in seen:
+                seen.add(input_id)
+                yield input_id, source
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        # Load a few images per worker at a time, so loading stays ahead of the requests without reading everything
+        for chunk in batched(unique_sources(), max_workers * 4):
+            images = executor.map(lambda item: _load_image(item[1], fetch), chunk)
+            for (input_id, source), image in zip(chunk, images):
+                yield source, resources_pb2.Input(id=input_id, data=resources_pb2.Data(image=image, text=prompt_text))
+
+def ask_about_images(model, image_sources, prompt, inference_params={}, batch_size=8, max_workers=4, fetch=False):
+    """Yield `(image_source, answer)` for every unique image in `image_sources`."""
+    sources = {}
+
+    def inputs():
+        for source, inp in multimodal_inputs(image_sources, prompt, fetch=fetch):
+            sources[inp.id] = source
+            yield inp
+
+    for inp, output in predict_in_batches(model, inputs(), batch_size=batch_size, max_workers=max_workers,
+                                          inference_params=inference_params):
+        yield sources.pop(inp.id), output.data.text.raw
+
+gpt_4_vision = get_model("https://clarifai.com/openai/chat-completion/models/openai-gpt-4-vision")
+for image, answer in ask_about_images(gpt_4_vision, image_urls, prompt, inference_params=inference_params):
+    print(f"{image}: {answer}")
+
+"""## Chaining Models
+
+Models are often chained: detect objects, crop them and caption each crop, or transcribe audio and summarize it with an LLM. Running the stages one blocking call after another makes every item wait for the sum of all stages.
+
+`run_pipeline` runs each `Stage` in its own thread connected by bounded queues, so while one stage works on an item the next stage is already processing the previous one. Every stage batches the inputs of several items into one request and keeps up to `workers` requests in flight. End-to-end throughput then approaches that of the slowest stage. A stage is declared by:
+ - `model` - the `Model` to predict with
+ - `to_inputs(item)` - the list of inputs to predict for an item (for example the crops of its detected regions)
+ - `combine(item, outputs)` - the item passed on to the next stage, given the outputs for its inputs
+
+If reading the items, a `to_inputs`, a prediction or a `combine` fails, `run_pipeline` raises that error right away and the remaining items are not read.
+"""
+
+import queue
+
+Stage = namedtuple("Stage", ["model", "to_inputs", "combine", "batch_size", "workers", "inference_params", "output_config"],
+                   defaults=(8, 2, {}, {}))
+
+_END_OF_ITEMS = object()
+
+def _put(queue_, item, stopped):
+    """Put `item` on `queue_`, giving up once `stopped` is set (nobody reads the results anymore)."""
+    while not stopped.is_set():
+        try:
+            queue_.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+def _run_stage(stage, inbox, outbox, errors, stopped, linger_s):
+    slots = threading.Semaphore(stage.workers)
+
+    def process(batch):
+        try:
+            inputs = [inp for _, item_inputs in batch for inp in item_inputs]
+            outputs = iter([output for chunk in batched(inputs)
+                            for output in stage.model.predict(chunk, inference_params=stage.inference_params,
+                                                              output_config=stage.output_config).outputs])
+            for item, item_inputs in batch:
+                _put(outbox, stage.combine(item, [next(outputs) for _ in item_inputs]), stopped)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            slots.release()
+
+    finished = False
+    try:
+        with ThreadPoolExecutor(max_workers=stage.workers) as executor:
+            batch, n_inputs = [], 0
+            while not finished and not stopped.is_set():
+                try:
+                    # Wait a little for more items to fill the batch, then send what we have
+                    item = inbox.get(timeout=linger_s if batch else 0.1)
+                except queue.Empty:
+                    item = None
+                if item is _END_OF_ITEMS:
+                    finished = True
+                elif item is not None:
+                    item_inputs = stage.to_inputs(item)
+                    batch.append((item, item_inputs))
+                    n_inputs += len(item_inputs)
+                if batch and (finished or item is None or n_inputs >= stage.batch_size):
+                    slots.acquire()
+                    executor.submit(process, batch)
+                    batch, n_inputs = [], 0
+    except Exception as error:
+        errors.append(error)
+        # Keep draining the inbox so the previous stages are never left blocked on a full queue
+        while not finished and not stopped.is_set():
+            try:
+                finished = inbox.get(timeout=0.1) is _END_OF_ITEMS
+            except queue.Empty:
+                pass
+    finally:
+        # Always tell the next stage there is nothing more, or it would wait forever
+        _put(outbox, _END_OF_ITEMS, stopped)
+
+def run_pipeline(items, stages, queue_size=16, linger_s=0.05):
+    """Stream `items` through `stages`, yielding the items that come out of the last stage."""
+    queues = [queue.Queue(maxsize=queue_size) for _ in range(len(stages) + 1)]
+    errors = []
+    stopped = threading.Event()
+
+    def feed():
+        try:
+            for item in items:
+                if errors: # a stage failed, stop reading items
+                    break
+                _put(queues[0], item, stopped)
+        except Exception as error:
+            errors.append(error)
+        finally:
+            _put(queues[0], _END_OF_ITEMS, stopped)
+
+    threads = [threading.Thread(target=feed, daemon=True)]
+    threads += [threading.Thread(target=_run_stage, args=(stage, queues[i], queues[i + 1], errors, stopped, linger_s),
+                                 daemon=True)
+                for i, stage in enumerate(stages)]
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            # Raise the first error as soon as it happens instead of after the remaining items
+            if errors:
+                raise errors[0]
+            try:
+                item = queues[-1].get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _END_OF_ITEMS:
+                break
+            yield item
+        if errors:
+            raise errors[0]
+    finally:
+        # Let the stage threads finish even when the results are not read to the end
+        stopped.set()
+
+"""Detecting objects, cropping them in-process and captioning every crop"""
+
+def load_image(url):
+    with urlopen(url) as response:
+        return {"url": url, "image": cv2.imdecode(np.frombuffer(response.read(), np.uint8), cv2.IMREAD_COLOR)}
+
+def encode_jpeg(image):
+    return cv2.imencode(".jpg", image)[1].tobytes()
+
+def detect_inputs(item):
+    return [Inputs.get_input_from_bytes(input_id="", image_bytes=encode_jpeg(item["image"]))]
+
+def add_detections(item, outputs):
+    detections = threshold_detections(regions_to_arrays(outputs), min_score=0.5)
+    detections = nms_detections(detections)
+    # Drop boxes less than a pixel wide or high, they can't be cropped
+    pixel_boxes = scale_boxes(detections.boxes, item["image"].shape)
+    keep = (pixel_boxes[:, 2] > pixel_boxes[:, 0]) & (pixel_boxes[:, 3] > pixel_boxes[:, 1])
+    item["detections"], item["pixel_boxes"] = select_detections(detections, keep), pixel_boxes[keep]
+    return item
+
+def crop_inputs(item):
+    return [Inputs.get_input_from_bytes(input_id="", image_bytes=encode_jpeg(item["image"][top:bottom, left:right]))
+            for top, left, bottom, right in item["pixel_boxes"]]
+
+def add_captions(item, outputs):
+    item["captions"] = [output.data.text.raw for output in outputs]
+    del item["image"] # done with the pixels, keep only the results
+    return item
+
+stages = [
+    Stage(get_model("https://clarifai.com/clarifai/main/models/general-image-detection"), detect_inputs, add_detections),
+    Stage(get_model("https://clarifai.com/salesforce/blip/models/general-english-image-caption-blip"),
+          crop_inputs, add_captions, batch_size=32),
+]
+
+for item in run_pipeline((load_image(url) for url in image_urls[:6]), stages):
+    print(item["url"])
+    for name, caption in zip(item["detections"].concept_names, item["captions"]):
+        print(f"  {name}: {caption}")
+
+"""## Exporting Predictions
+
+Keeping raw protobuf responses around for every input is expensive in both disk and memory. `PredictionFlattener` turns `outputs[*].data.concepts`, `regions[*]` and `frames[*]` into compact NumPy record arrays, one row per predicted concept, with concepts dictionary-encoded: each row stores an integer concept code and the ids and names are kept once in `concept_ids` / `concept_names`. Concepts below `min_value` are dropped while flattening.
+
+`write_parquet` streams those rows into a Parquet file (one row group per batch of outputs, concept ids stored as a dictionary column) so analytics over millions of predictions never need to parse protobuf again. It needs `pyarrow` (`pip install pyarrow`).
+"""
+
+import numpy as np
+
+PREDICTION_DTYPE = np.dtype([
+    ("input", np.int32),  # index into PredictionFlattener.input_ids
+    ("frame", np.int32),  # frame index, -1 for image/text outputs
+    ("region", np.int32), # region index, -1 for whole-input concepts
+    ("concept", np.int32), # index into PredictionFlattener.concept_ids / concept_names
+    ("value", np.float32),
+    ("top_row", np.float32), ("left_col", np.float32), ("bottom_row", np.float32), ("right_col", np.float32),
+])
+
+NO_BOX = (np.nan, np.nan, np.nan, np.nan)
+
+class PredictionFlattener:
+    """Flatten prediction outputs into `PREDICTION_DTYPE` record arrays."""
+
+    def __init__(self, min_value=0.0):
+        self.min_value = min_value
+        self.input_ids = []
+        self.concept_ids = []
+        self.concept_names = []
+        self._concept_codes = {}
+
+    def _concept_code(self, concept):
+        code = self._concept_codes.get(concept.id)
+        if code is None:
+            code = self._concept_codes[concept.id] = len(self.concept_ids)
+            self.concept_ids.append(concept.id)
+            self.concept_names.append(concept.name)
+        return code
+
+    def _add_concepts(self, rows, input_index, frame_index, region_index, concepts, box):
+        for concept in concepts:
+            if concept.value >= self.min_value:
+                rows.append((input_index, frame_index, region_index, self._concept_code(concept), concept.value) + box)
+
+    def _add_data(self, rows, input_index, frame_index, data):
+        self._add_concepts(rows, input_index, frame_index, -1, data.concepts, NO_BOX)
+        for region_index, region in enumerate(data.regions):
+            bbox = region.region_info.bounding_box
+            box = (bbox.top_row, bbox.left_col, bbox.bottom_row, bbox.right_col)
+            self._add_concepts(rows, input_index, frame_index, region_index, region.data.concepts, box)
+
+    def flatten(self, outputs):
+        """Return the rows of `outputs` as a record array."""
+        rows = []
+        for output in outputs:
+            input_index = len(self.input_ids)
+            self.input_ids.append(output.input.id)
+            self._add_data(rows, input_index, -1, output.data)
+            for frame_index, frame in enumerate(output.data.frames):
+                self._add_data(rows, input_index, frame_index, frame.data)
+        return np.array(rows, dtype=PREDICTION_DTYPE)
+
+def write_parquet(output_batches, path, min_value=0.0):
+    """Stream batches of outputs into a Parquet file at `path`, one row group per batch."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    flattener = PredictionFlattener(min_value)
+    writer = None
+    try:
+        for outputs in output_batches:
+            first_input = len(flattener.input_ids)
+            records = flattener.flatten(outputs)
+            input_ids = np.array(flattener.input_ids[first_input:], dtype=object)
+            columns = {
+                "input_id": pa.array(input_ids[records["input"] - first_input], pa.string()),
+                "concept_id": pa.DictionaryArray.from_arrays(records["concept"], flattener.concept_ids),
+                "concept_name": pa.DictionaryArray.from_arrays(records["concept"], flattener.concept_names),
+            }
+            for field in ("frame", "region", "value", "top_row", "left_col", "bottom_row", "right_col"):
+                columns[field] = records[field]
+            table = pa.table(columns)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+    finally:
+        if writer is not None:
+            writer.close()
+    return flattener
+
+"""Exporting batched predictions for the image URLs from the Batch Predictions section"""
+
+model = get_model("https://clarifai.com/clarifai/main/models/general-image-recognition")
+inputs = (Inputs.get_input_from_url(input_id=str(i), image_url=url) for i, url in enumerate(image_urls))
+outputs = (output for _, output in predict_in_batches(model, inputs, batch_size=16))
+
+write_parquet(batched(outputs, 16), "predictions.parquet", min_value=0.5)
+
+# Filters are pushed down to the Parquet reader, only matching row groups and rows are decoded
+import pyarrow.parquet as pq
+
+table = pq.read_table("predictions.parquet", columns=["input_id", "concept_name", "value"],
+                      filters=[("value", ">=", 0.95)])
+print(table.to_pandas().head())
+
+"""Without `pyarrow`, the record arrays can be kept and queried with NumPy directly"""
+
+flattener = PredictionFlattener(min_value=0.5)
+records = flattener.flatten(model.predict_by_url(DOG_IMAGE_URL, input_type="image").outputs)
+
+confident = records[records["value"] >= 0.95]
+print([flattener.concept_names[code] for code in confident["concept"]])
+
+"""## Benchmarking Client Performance
+
+Measuring the client side of the flows in this notebook against the real API mixes in network variance and needs a PAT. The benchmark below starts a local gRPC stand-in for the predict service that answers `GetModel` and `PostModelOutputs` with canned responses of realistic shape and size, one per section of this notebook: text generation, image classification (a single request, and a large list of inputs sent with `predict_in_batches`), a 1000-region detection, segmentation masks, multi-frame video, a large generated image, speech recognition and a multimodal answer.
+
+Each scenario predicts through a regular `Model` pointed at the mock service with `base_url`, decodes the response with the helpers from this notebook, and reports throughput and p50 / p99 latency. Peak memory is measured with `tracemalloc` on one extra run of each scenario, so it belongs to that scenario alone (memory that C extensions allocate outside Python's allocators, like protobuf message arenas, is not included). The results are written to `benchmark_results.json`, and if a previous results file is given as a baseline, scenarios whose p50 latency got more than 20% slower are flagged.
+"""
+
+import tracemalloc
+from concurrent import futures
+
+from clarifai_grpc.grpc.api.status import status_pb2
+
+MOCK_IMAGE_SIZE = (512, 512)
+
+def _concepts(n, prefix="concept"):
+    return [resources_pb2.Concept(id=f"{prefix}-{i}", name=f"{prefix} {i}", value=1 - i / n) for i in range(n)]
+
+def _encoded_image(shape, ext=".jpg"):
+    noise = np.random.default_rng(0).integers(0, 256, size=shape, dtype=np.uint8)
+    return cv2.imencode(ext, noise)[1].tobytes()
+
+def _image_inputs(n, shape=(256, 256, 3)):
+    image = _encoded_image(shape)
+    return [Inputs.get_input_from_bytes(input_id=str(i), image_bytes=image) for i in range(n)]
+
+def _wav_recording(seconds, rate=16000):
+    noise = np.random.default_rng(0).integers(-1000, 1000, size=seconds * rate, dtype=np.int16)
+    return _wav_bytes(noise.tobytes(), (1, 2, rate, 0, "NONE", "not compressed"))
+
+def _mask_region(i):
+    mask = np.zeros(MOCK_IMAGE_SIZE, dtype=np.uint8)
+    mask[i * 8:i * 8 + 64, i * 8:i * 8 + 64] = 255
+    return resources_pb2.Region(
+        region_info=resources_pb2.RegionInfo(mask=resources_pb2.Mask(
+            image=resources_pb2.Image(base64=cv2.imencode(".png", mask)[1].tobytes()))),
+        data=resources_pb2.Data(concepts=[resources_pb2.Concept(id=f"class-{i}", name=f"class {i}", value=0.5)]))
+
+def _detection_region(i):
+    top, left = (i % 40) / 40, (i // 40) / 25
+    return resources_pb2.Region(
+        region_info=resources_pb2.RegionInfo(bounding_box=resources_pb2.BoundingBox(
+            top_row=top, left_col=left, bottom_row=top + 0.02, right_col=left + 0.04)),
+        data=resources_pb2.Data(concepts=[resources_pb2.Concept(id=f"class-{i % 80}", name=f"class {i % 80}",
+                                                                value=(i % 100) / 100)]))
+
+# model_id -> (output data returned by the mock service, request inputs, predict and decode with a `Model`)
+BENCHMARK_SCENARIOS = {
+    "text-generation": (
+        resources_pb2.Data(text=resources_pb2.Text(raw="AI " * 700)),
+        [Inputs.get_input_from_bytes(input_id="0", text_bytes=b"Write a tweet on future of AI")],
+        lambda model, inputs: model.predict(inputs).outputs[0].data.text.raw),
+    "image-classification": (
+        resources_pb2.Data(concepts=_concepts(20)),
+        _image_inputs(8),
+        lambda model, inputs: PredictionFlattener().flatten(model.predict(inputs).outputs)),
+    "batched-classification": (
+        resources_pb2.Data(concepts=_concepts(20)),
+        _image_inputs(512, (64, 64, 3)),
+        lambda model, inputs: PredictionFlattener().flatten(
+            output for _, output in predict_in_batches(model, inputs, batch_size=32, max_workers=4))),
+    "image-detection": (
+        resources_pb2.Data(regions=[_detection_region(i) for i in range(1000)]),
+        _image_inputs(1),
+        lambda model, inputs: nms_detections(regions_to_arrays(model.predict(inputs).outputs))),
+    "image-segmentation": (
+        resources_pb2.Data(regions=[_mask_region(i) for i in range(50)]),
+        _image_inputs(1),
+        lambda model, inputs: masks_to_label_map(model.predict(inputs).outputs[0].data.regions, MOCK_IMAGE_SIZE)),
+    "video": (
+        resources_pb2.Data(frames=[resources_pb2.Frame(frame_info=resources_pb2.FrameInfo(index=i, time=i * 2000),
+                                                       data=resources_pb2.Data(concepts=_concepts(20)))
+                                   for i in range(300)]),
+        [Inputs.get_input_from_url(input_id="0", video_url="https://samples.clarifai.com/beer.mp4")],
+        lambda model, inputs: PredictionFlattener().flatten(model.predict(inputs).outputs)),
+    "image-generation": (
+        resources_pb2.Data(image=resources_pb2.Image(base64=_encoded_image((1024, 1024, 3)))),
+        [Inputs.get_input_from_bytes(input_id="0", text_bytes=b"A painting of a cat")],
+        lambda model, inputs: decode_output_image(model.predict(inputs).outputs[0])),
+    "speech-recognition": (
+        resources_pb2.Data(text=resources_pb2.Text(raw="Good morning. " * 100)),
+        [Inputs.get_input_from_bytes(input_id="0", audio_bytes=_wav_recording(30))],
+        lambda model, inputs: model.predict(inputs).outputs[0].data.text.raw),
+    "multimodal": (
+        resources_pb2.Data(text=resources_pb2.Text(raw="It is daytime. " * 20)),
+        [Inputs.get_multimodal_input(input_id="0", image_bytes=_encoded_image((512, 512, 3)),
+                                     raw_text="What time of day is it?")],
+        lambda model, inputs: model.predict(inputs).outputs[0].data.text.raw),
+}
+
+class MockPredictService(grpc.GenericRpcHandler):
+    """Answers `GetModel` and `PostModelOutputs` with canned responses, keyed by `model_id`.
+
+    Every predict call takes at least `latency_s` seconds, standing in for the network and the model.
+    """
+
+    def __init__(self, scenarios, latency_s=0.0):
+        self.latency_s = latency_s
+        self._data = {model_id: data for model_id, (data, _, _) in scenarios.items()}
+        self._responses = {}
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.cancelled = 0 # calls whose client went away (cancelled or deadline exceeded) before the response
+
+    def _response(self, model_id, inputs):
+        key = (model_id, tuple(inp.id for inp in inputs))
+        if key not in self._responses:
+            response = service_pb2.MultiOutputResponse(status=status_pb2.Status(code=status_code_pb2.SUCCESS))
+            for inp in inputs:
+                response.outputs.add(input=resources_pb2.Input(id=inp.id), data=self._data[model_id])
+            self._responses[key] = response.SerializeToString()
+        return self._responses[key]
+
+    def post_model_outputs(self, request, context):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if self.latency_s:
+                time.sleep(self.latency_s)
+            if not context.is_active():
+                with self._lock:
+                    self.cancelled += 1
+            return self._response(request.model_id, request.inputs)
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def get_model(self, request, context):
+        model = resources_pb2.Model(id=request.model_id, user_id=request.user_app_id.user_id,
+                                    app_id=request.user_app_id.app_id)
+        return service_pb2.SingleModelResponse(status=status_pb2.Status(code=status_code_pb2.SUCCESS),
+                                               model=model).SerializeToString()
+
+    def service(self, handler_call_details):
+        handlers = {
+            "/clarifai.api.V2/PostModelOutputs": (self.post_model_outputs, service_pb2.PostModelOutputsRequest),
+            "/clarifai.api.V2/GetModel": (self.get_model, service_pb2.GetModelRequest),
+        }
+        if handler_call_details.method not in handlers:
+            return None
+        handler, request_type = handlers[handler_call_details.method]
+        return grpc.unary_unary_rpc_method_handler(handler, request_deserializer=request_type.FromString)
+
+def start_mock_server(scenarios, port=0, latency_s=0.0):
+    """Start the mock predict service on localhost, returns `(server, service, port)`."""
+    service = MockPredictService(scenarios, latency_s)
+    server = grpc.server(futures.ThreadPoolExecutor(max_workers=16),
+                         options=[("grpc.max_send_message_length", 256 * 2**20)])
+    server.add_generic_rpc_handlers((service,))
+    port = server.add_insecure_port(f"localhost:{port}")
+    server.start()
+    return server, service, port
+
+def mock_model(port, model_id):
+    """A regular `Model` whose requests go to the mock service listening on `port`."""
+    return Model(user_id="mock", app_id="mock", model_id=model_id, base_url=f"http://localhost:{port}", pat="mock")
+
+def run_benchmarks(scenarios=BENCHMARK_SCENARIOS, iterations=50, results_path="benchmark_results.json",
+                   baseline_path=None, regression_threshold=1.2):
+    server, _, port = start_mock_server(scenarios)
+    results = {}
+    try:
+        for model_id, (_, inputs, run) in scenarios.items():
+            model = mock_model(port, model_id)
+            run(model, inputs) # warm up the channel
+            latencies = []
+            for _ in range(iterations):
+                start = time.perf_counter()
+                run(model, inputs)
+                latencies.append(time.perf_counter() - start)
+            # Tracing allocations slows everything down, so memory is measured on a separate run
+            tracemalloc.start()
+            run(model, inputs)
+            peak_bytes = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            latencies = np.array(latencies)
+            results[model_id] = {
+                "inputs_per_s": len(inputs) * iterations / latencies.sum(),
+                "p50_ms": float(np.percentile(latencies, 50) * 1000),
+                "p99_ms": float(np.percentile(latencies, 99) * 1000),
+                "peak_traced_mib": peak_bytes / 2**20,
+            }
+    finally:
+        server.stop(None)
+
+    with open(results_path, "w") as f:
+        json.dump(results, f, indent=2)
+
+    if baseline_path and os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        for model_id, result in results.items():
+            if model_id in baseline and result["p50_ms"] > baseline[model_id]["p50_ms"] * regression_threshold:
+                print(f"REGRESSION {model_id}: p50 {baseline[model_id]['p50_ms']:.2f} ms -> {result['p50_ms']:.2f} ms")
+    return results
+
+for model_id, result in run_benchmarks().items():
+    print(f"{model_id:22} {result['inputs_per_s']:8.1f} inputs/s  p50 {result['p50_ms']:7.2f} ms  "
+          f"p99 {result['p99_ms']:7.2f} ms  peak {result['peak_traced_mib']:.1f} MiB")
+
+"""Comparing throughput of one call per input against batched predictions for the image URLs from the Batch Predictions section, with 20 ms of simulated latency per request"""
+
+server, _, port = start_mock_server(BENCHMARK_SCENARIOS, latency_s=0.02)
+try:
+    model = mock_model(port, "image-classification")
+
+    start = time.perf_counter()
+    for url in image_urls:
+        model.predict_by_url(url, input_type="image")
+    single_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    inputs = (Inputs.get_input_from_url(input_id=str(i), image_url=url) for i, url in enumerate(image_urls))
+    for _ in predict_in_batches(model, inputs, batch_size=16):
+        pass
+    batched_time = time.perf_counter() - start
+finally:
+    server.stop(None)
+
+print(f"One call per input: {len(image_urls) / single_time:.1f} inputs/s")
+print(f"Batched:            {len(image_urls) / batched_time:.1f} inputs/s")
+
+"""Checking `AsyncModel` against the mock service: concurrency limit, deadlines and cancellation"""
+
+async def check_async_model(port, service):
+    async_model = AsyncModel(mock_model(port, "image-classification"), max_concurrency=4)
+    inputs = _image_inputs(1)
+    try:
+        responses = await asyncio.gather(*(async_model.predict(inputs) for _ in range(20)))
+        assert all(response.outputs[0].input.id == "0" for response in responses)
+        assert service.max_in_flight <= 4, f"{service.max_in_flight} requests in flight"
+
+        try:
+            await async_model.predict(inputs, timeout=service.latency_s / 4)
+            raise AssertionError("the deadline was not enforced")
+        except grpc.aio.AioRpcError as error:
+            assert error.code() == grpc.StatusCode.DEADLINE_EXCEEDED, error.code()
+        await asyncio.sleep(service.latency_s) # let the server finish the abandoned call
+        assert service.cancelled == 1, "the server did not see the deadline"
+
+        task = asyncio.create_task(async_model.predict(inputs))
+        await asyncio.sleep(service.latency_s / 4)
+        task.cancel()
+        try:
+            await task
+            raise AssertionError("the call was not cancelled")
+        except asyncio.CancelledError:
+            pass
+        await asyncio.sleep(service.latency_s)
+        assert service.cancelled == 2, "the server did not see the cancellation"
+    finally:
+        await async_model.close()
+
+server, service, port = start_mock_server(BENCHMARK_SCENARIOS, latency_s=0.1)
+try:
+    asyncio.run(check_async_model(port, service))
+finally:
+    server.stop(None)
+print(f"AsyncModel OK: at most {service.max_in_flight} requests in flight, deadline and cancellation reached the server")
+
 """## Clarifai Resources
 
 **Website**: [https://www.clarifai.com](https://www.clarifai.com/)
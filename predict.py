@@ -0,0 +1,192 @@
+"""Slim command line entry point for a single Clarifai prediction.
+
+Running a prediction through `model_predict.py` imports the whole notebook's dependencies
+(`clarifai.client.app`, `clarifai.client.user`, NumPy, OpenCV, Matplotlib, PIL...) even for a text-only call.
+Even `clarifai.client.model` alone loads NumPy, PIL and the app and user clients. This script calls
+`PostModelOutputs` directly with the `clarifai_grpc` stub, which needs none of them, and imports NumPy / OpenCV
+only when an output actually has to be decoded (`--thumbnail`), which keeps short-lived jobs fast to start.
+
+Examples:
+    python predict.py https://clarifai.com/anthropic/completion/models/claude-v2 --text "Write a tweet on future of AI"
+    python predict.py https://clarifai.com/clarifai/main/models/general-image-recognition \\
+        --url https://samples.clarifai.com/dog2.jpeg --input-type image --max-concepts 3
+    python predict.py https://clarifai.com/stability-ai/stable-diffusion-2/models/stable-diffusion-xl \\
+        --text "A painting of a cat" --save cat.jpg --thumbnail cat_thumb.jpg
+    python predict.py --import-time
+
+*Note: CLARIFAI_PAT should be set as an environment variable*
+"""
+
+import argparse
+import json
+import re
+import os
+import subprocess
+import sys
+import time
+from urllib.parse import urlparse
+
+# Everything `model_predict.py` imports before its first prediction
+NOTEBOOK_IMPORTS = ("import clarifai.client.app, clarifai.client.user, clarifai.client.model, "
+                    "clarifai_grpc.grpc.api.resources_pb2, numpy, cv2, matplotlib.pyplot, PIL.Image, random")
+SLIM_IMPORTS = ("import argparse, json, os, re, subprocess, time, urllib.parse, "
+                "clarifai_grpc.channel.clarifai_channel, clarifai_grpc.grpc.api.service_pb2_grpc")
+
+# Statuses `Model.predict` keeps retrying while the model is being deployed, and for how long
+RETRYABLE_STATUSES = ("MODEL_DEPLOYING", "MODEL_LOADING", "MODEL_BUSY_PLEASE_RETRY")
+RETRY_FOR_S = 600
+
+
+def parse_model_url(model_url):
+    """Return `(user_id, app_id, model_id, version_id)` of
+    `https://clarifai.com/{user_id}/{app_id}/models/{model_id}[/model_version/{version_id}]`."""
+    parts = urlparse(model_url).path.strip("/").split("/")
+    if len(parts) not in (4, 6) or parts[2] != "models":
+        raise ValueError(f"Not a Clarifai model URL: {model_url}")
+    return parts[0], parts[1], parts[3], parts[5] if len(parts) == 6 else ""
+
+
+def connect(prewarm=False):
+    """Return a `V2Stub` on a gRPC channel to the Clarifai API (`CLARIFAI_GRPC_BASE`, api.clarifai.com by default).
+
+    With `prewarm`, the channel is connected right away, so its TLS handshake is already done when the
+    prediction is sent.
+    """
+    import grpc
+    from clarifai_grpc.channel.clarifai_channel import ClarifaiChannel
+    from clarifai_grpc.grpc.api import service_pb2_grpc
+
+    channel = ClarifaiChannel.get_grpc_channel()
+    if prewarm:
+        grpc.channel_ready_future(channel).result(timeout=30)
+    return service_pb2_grpc.V2Stub(channel)
+
+
+def make_input(input_type, text=None, url=None, file=None):
+    """Build the `resources_pb2.Input` for one of `text`, `url` or the contents of `file`."""
+    from clarifai_grpc.grpc.api import resources_pb2
+
+    data_type = {"text": resources_pb2.Text, "image": resources_pb2.Image,
+                 "video": resources_pb2.Video, "audio": resources_pb2.Audio}[input_type]
+    if url is not None:
+        data = data_type(url=url)
+    else:
+        if text is None:
+            with open(file, "rb") as f:
+                contents = f.read()
+        if input_type == "text":
+            data = data_type(raw=text if text is not None else contents.decode())
+        else:
+            data = data_type(base64=contents)
+    return resources_pb2.Input(data=resources_pb2.Data(**{input_type: data}))
+
+
+def predict(stub, model_url, inp, inference_params={}, output_config={}):
+    """Predict `inp` with the model at `model_url`, retrying like `Model.predict` while the model is deploying."""
+    from clarifai_grpc.grpc.api import resources_pb2, service_pb2
+    from clarifai_grpc.grpc.api.status import status_code_pb2
+
+    user_id, app_id, model_id, version_id = parse_model_url(model_url)
+    request = service_pb2.PostModelOutputsRequest(
+        user_app_id=resources_pb2.UserAppIDSet(user_id=user_id, app_id=app_id),
+        model_id=model_id, version_id=version_id, inputs=[inp],
+        model=resources_pb2.Model(model_version=resources_pb2.ModelVersion(output_info=resources_pb2.OutputInfo(
+            output_config=resources_pb2.OutputConfig(**output_config)))))
+    request.model.model_version.output_info.params.update(inference_params)
+    metadata = (("authorization", f"Key {os.environ['CLARIFAI_PAT']}"),)
+
+    start, retries = time.monotonic(), 0
+    while True:
+        response = stub.PostModelOutputs(request, metadata=metadata)
+        if (status_code_pb2.StatusCode.Name(response.status.code) in RETRYABLE_STATUSES
+                and time.monotonic() - start < RETRY_FOR_S):
+            retries += 1
+            time.sleep(0.1 * 1.3 ** retries)
+            continue
+        if response.status.code != status_code_pb2.SUCCESS:
+            raise Exception(f"Model predict failed with response {response.status!r}")
+        return response
+
+
+def save_thumbnail(encoded_image, path, max_side=256):
+    """Decode an encoded image output at reduced size and write it to `path`."""
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(np.frombuffer(encoded_image, np.uint8), cv2.IMREAD_REDUCED_COLOR_2)
+    scale = max_side / max(img.shape[:2])
+    if scale < 1:
+        img = cv2.resize(img, (round(img.shape[1] * scale), round(img.shape[0] * scale)),
+                         interpolation=cv2.INTER_AREA)
+    cv2.imwrite(path, img)
+
+
+def measure_import_time(statement):
+    """Return the total time in seconds `python -X importtime -c statement` spends importing modules."""
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", statement],
+                            capture_output=True, text=True, check=True)
+    total_us = 0
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        match = re.match(r"import time:\s+\d+ \|\s+(\d+) \| (\s*)\S", line)
+        if match and not match.group(2): # top-level imports only, nested ones are in their cumulative time
+            total_us += int(match.group(1))
+    return total_us / 1e6
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run a single prediction with a Clarifai model.")
+    parser.add_argument("model_url", nargs="?", help="URL of the model to predict with")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--text", help="raw text input")
+    source.add_argument("--url", help="URL of the input")
+    source.add_argument("--file", help="path of the input file")
+    parser.add_argument("--input-type", default="text", choices=["text", "image", "video", "audio"])
+    parser.add_argument("--inference-params", type=json.loads, default={},
+                        help='JSON object, e.g. \'{"temperature": 0.2, "max_tokens": 100}\'')
+    parser.add_argument("--max-concepts", type=int)
+    parser.add_argument("--min-value", type=float)
+    parser.add_argument("--prewarm", action="store_true", help="open the gRPC channel before predicting")
+    parser.add_argument("--save", help="write an image or audio output to this path as-is")
+    parser.add_argument("--thumbnail", help="write a downscaled copy of an image output to this path")
+    parser.add_argument("--import-time", action="store_true",
+                        help="compare the import time of this script against the notebook's imports")
+    args = parser.parse_args(argv)
+    if not args.import_time and not (args.model_url and (args.text or args.url or args.file)):
+        parser.error("a model URL and one of --text, --url or --file are required")
+    return args
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.import_time:
+        print(f"predict.py imports:        {measure_import_time(SLIM_IMPORTS):.3f} s")
+        print(f"model_predict.py imports:  {measure_import_time(NOTEBOOK_IMPORTS):.3f} s")
+        return
+
+    stub = connect(prewarm=args.prewarm)
+    output_config = {}
+    if args.max_concepts is not None:
+        output_config["max_concepts"] = args.max_concepts
+    if args.min_value is not None:
+        output_config["min_value"] = args.min_value
+
+    input_type = "text" if args.text is not None else args.input_type
+    inp = make_input(input_type, text=args.text, url=args.url, file=args.file)
+    response = predict(stub, args.model_url, inp, args.inference_params, output_config)
+
+    data = response.outputs[0].data
+    if data.text.raw:
+        print(data.text.raw)
+    for concept in data.concepts:
+        print(f"{concept.name}: {round(concept.value, 4)}")
+    encoded = data.image.base64 or data.audio.base64
+    if args.save and encoded:
+        with open(args.save, "wb") as f:
+            f.write(encoded)
+    if args.thumbnail and data.image.base64:
+        save_thumbnail(data.image.base64, args.thumbnail)
+
+
+if __name__ == "__main__":
+    main()